@@ -211,15 +211,20 @@ class DomainDecorator(PropertiesDecorator):
 
         return cpu_widget
 
-    def icon(self) -> Gtk.Image:
-        """Returns a Gtk.Image using themed icons (HiDPI-safe)"""
+    def icon_name(self):
+        """Returns the themed icon name of the domain, None for no domain"""
         if self.vm is None:
-           return None
+            return None
         try:
-           icon_name = getattr(self.vm, "icon", self.vm.label.icon)
+            return getattr(self.vm, "icon", self.vm.label.icon)
         except exc.QubesDaemonCommunicationError:
-           icon_name = "appvm-black"
+            return "appvm-black"
 
+    def icon(self) -> Gtk.Image:
+        """Returns a Gtk.Image using themed icons (HiDPI-safe)"""
+        icon_name = self.icon_name()
+        if icon_name is None:
+            return None
         return Gtk.Image.new_from_icon_name(icon_name, Gtk.IconSize.MENU)
 
     def netvm(self) -> Gtk.Label:
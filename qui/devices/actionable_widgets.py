@@ -26,7 +26,8 @@ Use generate_wrapper_widget to get a wrapped widget.
 import asyncio
 import functools
 import pathlib
-from typing import Iterable, Callable, Optional, List
+from html import escape
+from typing import Iterable, Callable, Optional, List, Dict, Set, Tuple
 
 import qubesadmin
 import qubesadmin.devices
@@ -35,12 +36,37 @@ import qubesadmin.vm
 import gi
 
 gi.require_version("Gtk", "3.0")  # isort:skip
-from gi.repository import Gtk, GdkPixbuf, GLib  # isort:skip
+from gi.repository import Gtk, GdkPixbuf, GLib, Pango  # isort:skip
 
 from . import backend
 import time
 
+_ICON_THEME: Optional[Gtk.IconTheme] = None
 
+# running widget actions; asyncio only keeps weak references to tasks
+_TASKS: Set[asyncio.Task] = set()
+
+# size -> blank placeholder used when no icon could be found
+_BLANK_PIXBUFS: Dict[int, GdkPixbuf.Pixbuf] = {}
+
+# for how long (in seconds) a newly connected device gets the NEW label
+NEW_DEVICE_WINDOW_SEC = 120.0
+
+# icons used by menu items regardless of device or qube
+COMMON_ICONS = ("arrow", "detach", "settings", "check", "question-icon")
+
+
+def _icon_theme() -> Gtk.IconTheme:
+    """Default icon theme. Fetched on first use, as it needs a display; icon
+    caches of this module are cleared whenever the theme changes."""
+    global _ICON_THEME  # pylint: disable=global-statement
+    if _ICON_THEME is None:
+        _ICON_THEME = Gtk.IconTheme.get_default()
+        _ICON_THEME.connect("changed", _clear_icon_caches)
+    return _ICON_THEME
+
+
+@functools.lru_cache(maxsize=512)
 def load_icon(icon_name: str, backup_name: str, size: int = 24):
     """Load icon from provided name/path, if available. If not, load backup
     icon. If icon not found in any of the above ways, load a blank icon of
@@ -50,35 +76,76 @@ def load_icon(icon_name: str, backup_name: str, size: int = 24):
 
     To enable local testing, there is a fallback that tries to load icons from
     local directory.
+
+    Results are cached until the icon theme changes; the returned pixbuf is
+    shared, so callers must not modify it.
     """
-    try:
-        image: GdkPixbuf.Pixbuf = Gtk.IconTheme.get_default().load_icon(
-            icon_name, size, Gtk.IconLookupFlags.FORCE_SIZE
-        )
-        return image
-    except (TypeError, GLib.Error):
+    for name in (icon_name, backup_name):
         try:
-            image: GdkPixbuf.Pixbuf = Gtk.IconTheme.get_default().load_icon(
-                backup_name, size, Gtk.IconLookupFlags.FORCE_SIZE
-            )
-            return image
+            return _icon_theme().load_icon(name, size, Gtk.IconLookupFlags.FORCE_SIZE)
         except (TypeError, GLib.Error):
-            try:
-                # this is a workaround in case we are running this locally
-                icon_path = (
-                    str(pathlib.Path().resolve())
-                    + "/icons/scalable/"
-                    + icon_name
-                    + ".svg"
-                )
-                return GdkPixbuf.Pixbuf.new_from_file_at_size(icon_path, size, size)
-            except (GLib.Error, TypeError):
-                # we are giving up and just using a blank icon
-                pixbuf: GdkPixbuf.Pixbuf = GdkPixbuf.Pixbuf.new(
-                    GdkPixbuf.Colorspace.RGB, True, 8, size, size
-                )
-                pixbuf.fill(0x000)
-                return pixbuf
+            continue
+
+    # this is a workaround in case we are running this locally
+    icon_path = str(pathlib.Path().resolve()) + "/icons/scalable/" + icon_name + ".svg"
+    try:
+        return GdkPixbuf.Pixbuf.new_from_file_at_size(icon_path, size, size)
+    except (GLib.Error, TypeError):
+        pass
+
+    # we are giving up and just using a blank icon
+    pixbuf = _BLANK_PIXBUFS.get(size)
+    if pixbuf is None:
+        pixbuf = GdkPixbuf.Pixbuf.new(GdkPixbuf.Colorspace.RGB, True, 8, size, size)
+        pixbuf.fill(0x000)
+        _BLANK_PIXBUFS[size] = pixbuf
+    return pixbuf
+
+
+def _clear_icon_caches(*_args):
+    """Forget all cached icon lookups, e.g. after icon theme change."""
+    load_icon.cache_clear()
+    _resolve_variant_name.cache_clear()
+
+
+@functools.lru_cache(maxsize=256)
+def _resolve_variant_name(icon_name: str, is_light: bool) -> str:
+    """Themed name of the -light/-dark version of the icon, if the theme
+    has one, otherwise icon_name."""
+    candidate = icon_name + ("-light" if is_light else "-dark")
+    if _icon_theme().has_icon(candidate):
+        return candidate
+    return icon_name
+
+
+def prefetch_icons(names_variants: Iterable[Tuple[str, bool]]):
+    """Resolve variant names of all provided (icon_name, is_light) pairs in
+    one go, before widgets using them are created."""
+    for icon_name, is_light in names_variants:
+        _resolve_variant_name(icon_name, is_light)
+
+
+def warmup_icon_cache(variant: str):
+    """Resolve icons used by every device menu in advance, so that the first
+    menu opened does not pay for it. Meant to be run when idle."""
+    is_light = variant == "light"
+    prefetch_icons((name, is_light) for name in (*COMMON_ICONS, "mic", "camera"))
+
+
+def _set_label(label: Gtk.Label, markup: str):
+    """Set label contents from markup, skipping markup parsing if there is
+    nothing to parse."""
+    if "<" in markup or "&" in markup:
+        label.set_markup(markup)
+    else:
+        label.set_text(markup)
+
+
+def _add_classes(widget: Gtk.Widget, *classes: str):
+    """Add all provided CSS classes to the widget's style context."""
+    style_context = widget.get_style_context()
+    for css_class in classes:
+        style_context.add_class(css_class)
 
 
 class ActionableWidget:
@@ -95,20 +162,19 @@ class ActionableWidget:
 
 class VariantIcon(Gtk.Image):
     def __init__(self, icon_name, initial_variant: str, size: int):
-        super().__init__()
+        is_light = initial_variant == "light"
+        # set the icon right away, instead of updating an empty image
+        super().__init__(
+            icon_name=_resolve_variant_name(icon_name, is_light),
+            icon_size=Gtk.IconSize.MENU,
+        )
         self.icon_name = icon_name
         self.size = size
-        self.is_light = (initial_variant == "light")
-        self._apply()
+        self.is_light = is_light
 
     def _pick_name(self):
         # prefer explicit -light/-dark if present, else fallback to base
-        theme = Gtk.IconTheme.get_default()
-        suffix = "-light" if self.is_light else "-dark"
-        candidate = self.icon_name + suffix
-        if theme.has_icon(candidate):
-            return candidate
-        return self.icon_name
+        return _resolve_variant_name(self.icon_name, self.is_light)
 
     def _apply(self):
         # NOTE: Gtk.IconSize.MENU is fine; GTK handles HiDPI.
@@ -141,15 +207,15 @@ class VMWithIcon(Gtk.Box):
 
         self.backend_label = Gtk.Label(xalign=0)
         backend_label: str = name or vm.name
-        self.backend_label.set_markup(backend_label)
+        self.backend_label.set_text(backend_label)
 
         self.pack_start(self.backend_icon, False, False, 4)
         self.pack_start(self.backend_label, False, False, 0)
 
-        self.get_style_context().add_class("vm_item")
+        _add_classes(self, "vm_item")
 
 
-class VMInfoBox(Gtk.Box):
+class VMInfoBox(Gtk.Grid):
     """
     Information about device.
     For all devices, it has:
@@ -161,27 +227,27 @@ class VMInfoBox(Gtk.Box):
     """
 
     def __init__(self, device: backend.Device, variant: str = "dark"):
-        super().__init__(orientation=Gtk.Orientation.HORIZONTAL)
+        # spacing equivalent to packing each item with 4px padding
+        super().__init__(column_spacing=8, margin_start=4, margin_end=4)
 
         backend_vm = device.backend_domain
-        frontend_vms = list(device.attachments)
         # backend is always there
         backend_vm_icon = VMWithIcon(backend_vm, name=device.port)
-        backend_vm_icon.get_style_context().add_class("main_device_vm")
-        self.pack_start(backend_vm_icon, False, False, 4)
+        _add_classes(backend_vm_icon, "main_device_vm")
+        self.attach(backend_vm_icon, 0, 0, 1, 1)
 
-        if frontend_vms:
-            # arrow
-            self.arrow = VariantIcon("arrow", variant, 15)
-            self.pack_start(self.arrow, False, False, 4)
+        for i, vm in enumerate(device.attachments):
+            if i == 0:
+                # arrow
+                self.arrow = VariantIcon("arrow", variant, 15)
+                self.attach(self.arrow, 1, 0, 1, 1)
 
-            for vm in frontend_vms:
-                # vm
-                # potential topic to explore: commas
-                vm_name = VMWithIcon(vm)
-                vm_name.get_style_context().add_class("main_device_vm")
+            # vm
+            # potential topic to explore: commas
+            vm_name = VMWithIcon(vm)
+            _add_classes(vm_name, "main_device_vm")
 
-                self.pack_start(vm_name, False, False, 4)
+            self.attach(vm_name, 2 + i, 0, 1, 1)
 
 
 #### Non-interactive items
@@ -195,8 +261,7 @@ class InfoHeader(Gtk.Label, ActionableWidget):
     def __init__(self, text):
         super().__init__()
         self.set_text(text)
-        self.get_style_context().add_class("device_header")
-        self.get_style_context().add_class("main_device_item")
+        _add_classes(self, "device_header", "main_device_item")
         self.set_halign(Gtk.Align.START)
         self.actionable = False
 
@@ -207,23 +272,35 @@ class SeparatorItem(Gtk.Separator, ActionableWidget):
     def __init__(self):
         super().__init__()
         self.actionable = False
-        self.get_style_context().add_class("separator_item")
+        _add_classes(self, "separator_item")
 
 
 #### Attach/detach action items
 
 
 class SimpleActionWidget(Gtk.Box):
-    def __init__(self, icon_name, text, variant: str = "dark"):
-        """Widget with an action and an icon."""
+    _BOLD_ATTRIBUTES = Pango.AttrList()
+    _BOLD_ATTRIBUTES.insert(Pango.attr_weight_new(Pango.Weight.BOLD))
+
+    def __init__(self, icon_name, text, variant: str = "dark", bold: bool = False):
+        """Widget with an action and an icon.
+        :param icon_name: name of the icon
+        :param text: text on the widget; plain text if bold, markup otherwise
+        :param variant: light / dark string
+        :param bold: should the whole text be bold
+        """
         super().__init__()
         self.set_orientation(Gtk.Orientation.HORIZONTAL)
         self.icon = VariantIcon(icon_name, variant, 24)
         self.text_label = Gtk.Label()
         self.text_label.set_line_wrap_mode(Gtk.WrapMode.WORD)
-        self.text_label.set_markup(text)
+        if bold:
+            self.text_label.set_text(text)
+            self.text_label.set_attributes(self._BOLD_ATTRIBUTES)
+        else:
+            _set_label(self.text_label, text)
         self.text_label.set_xalign(0)
-        self.get_style_context().add_class("vm_item")
+        _add_classes(self, "vm_item")
 
         self.pack_start(self.icon, False, False, 5)
         self.pack_start(self.text_label, True, True, 0)
@@ -232,13 +309,15 @@ class SimpleActionWidget(Gtk.Box):
 class AttachWidget(ActionableWidget, VMWithIcon):
     """Attach device to qube action"""
 
+    _BLOCKED_TEMPLATE = "{} <i>(blocked by policy)</i>"
+
     def __init__(self, vm: backend.VM, device: backend.Device):
         super().__init__(vm)
         self.vm = vm
         self.device = device
         if not self.device.is_valid_for_vm(self.vm):
             self.backend_label.set_markup(
-                self.backend_label.get_text() + " <i>(blocked by policy)</i>"
+                self._BLOCKED_TEMPLATE.format(escape(self.backend_label.get_text()))
             )
             self.actionable = False
 
@@ -249,8 +328,10 @@ class AttachWidget(ActionableWidget, VMWithIcon):
 class DetachWidget(ActionableWidget, SimpleActionWidget):
     """Detach device from a VM"""
 
+    _TEMPLATE = "Detach from {}"
+
     def __init__(self, vm: backend.VM, device: backend.Device, variant: str = "dark"):
-        super().__init__("detach", "<b>Detach from " + vm.name + "</b>", variant)
+        super().__init__("detach", self._TEMPLATE.format(vm.name), variant, bold=True)
         self.vm = vm
         self.device = device
 
@@ -261,14 +342,17 @@ class DetachWidget(ActionableWidget, SimpleActionWidget):
 class DetachWithWidget(ActionableWidget, SimpleActionWidget):
     """Detach device from a VM with another device"""
 
+    _TEMPLATE = "Detach from {} with {}"
+
     def __init__(self, vm: backend.VM, device: backend.Device, variant: str = "dark"):
         second_device_names = ", ".join(
-            [dev.name for dev in device.devices_to_attach_with_me]
+            dev.name for dev in device.devices_to_attach_with_me
         )
         super().__init__(
             "detach",
-            "<b>Detach from " + vm.name + " with " + second_device_names + "</b>",
+            self._TEMPLATE.format(vm.name, second_device_names),
             variant,
+            bold=True,
         )
         self.vm = vm
         self.device = device
@@ -280,10 +364,10 @@ class DetachWithWidget(ActionableWidget, SimpleActionWidget):
 class DetachAndShutdownWidget(ActionableWidget, SimpleActionWidget):
     """Detach device from a disposable VM and shut it down."""
 
+    _TEMPLATE = "Detach and shut down {}"
+
     def __init__(self, vm: backend.VM, device: backend.Device, variant: str = "dark"):
-        super().__init__(
-            "detach", "<b>Detach and shut down " + vm.name + "</b>", variant
-        )
+        super().__init__("detach", self._TEMPLATE.format(vm.name), variant, bold=True)
         self.vm = vm
         self.device = device
 
@@ -366,11 +450,14 @@ class ToggleFeatureItem(ActionableWidget, SimpleActionWidget):
 
 
 class StartUSBVM(ActionableWidget, SimpleActionWidget):
+    _TEMPLATE = "List USB Devices (start {})"
+
     def __init__(self, usbvm: backend.VM, variant: str = "dark"):
         super().__init__(
             icon_name=usbvm.icon_name,
-            text="<b>List USB Devices " "(start {})</b>".format(usbvm.name),
+            text=self._TEMPLATE.format(usbvm.name),
             variant=variant,
+            bold=True,
         )
         self.usbvm = usbvm
 
@@ -387,44 +474,47 @@ class DeviceSettingsWidget(ActionableWidget, SimpleActionWidget):
     """
 
     def __init__(self, device: backend.Device, variant: str = "dark"):
-        super().__init__("settings", "<b>Device settings</b>", variant)
+        super().__init__("settings", "Device settings", variant, bold=True)
         self.variant = variant
         self.device = device
 
     def get_child_widgets(self):
-        if self.device.device_group == "Camera":
+        """Items of the settings submenu; DeviceMenu requests them only when
+        the submenu is first selected."""
+        device = self.device
+        if device.device_group == "Camera":
             yield ToggleFeatureItem(
                 "check",
                 "Attach with Microphone",
-                bool(self.device.devices_to_attach_with_me),
-                self.device,
+                bool(device.devices_to_attach_with_me),
+                device,
                 backend.FEATURE_ATTACH_WITH_MIC,
                 self.variant,
             )
 
-        if self.device.has_children:
+        if device.has_children:
             yield ToggleFeatureItem(
                 "check",
                 "Show child devices",
-                self.device.show_children,
-                self.device,
+                device.show_children,
+                device,
                 backend.FEATURE_HIDE_CHILDREN,
                 self.variant,
             )
 
-        gaw_item = GlobalAttachmentWidget(self.device, self.variant)
+        gaw_item = GlobalAttachmentWidget(device, self.variant)
         yield gaw_item
 
     def toggle_feature(self, feature_name, *_args):
         feature = self.device.backend_domain.features.get(feature_name, "")
-        all_devs: List[str] = feature.split(" ")
+        all_devs: Set[str] = set(feature.split())
 
         if self.device.id_string in all_devs:
             all_devs.remove(self.device.id_string)
         else:
-            all_devs.append(self.device.id_string)
+            all_devs.add(self.device.id_string)
 
-        new_feature = " ".join(all_devs)
+        new_feature = " ".join(sorted(all_devs))
         self.device.backend_domain.features[feature_name] = new_feature
 
     async def widget_action(self, *_args):
@@ -437,7 +527,7 @@ class GlobalAttachmentWidget(ActionableWidget, SimpleActionWidget):
     """
 
     def __init__(self, device: backend.Device, variant: str = "dark"):
-        super().__init__("settings", "<b>Auto Attach Settings...</b>", variant)
+        super().__init__("settings", "Auto Attach Settings...", variant, bold=True)
         self.device = device
 
     async def widget_action(self, *_args):
@@ -450,7 +540,7 @@ class GlobalSettingsWidget(ActionableWidget, SimpleActionWidget):
     """
 
     def __init__(self, device: backend.Device, variant: str = "dark"):
-        super().__init__("settings", "<b>Global device settings</b>", variant)
+        super().__init__("settings", "Global device settings", variant, bold=True)
         self.device = device
 
     async def widget_action(self, *_args):
@@ -463,7 +553,7 @@ class HelpWidget(ActionableWidget, SimpleActionWidget):
     """
 
     def __init__(self, device: backend.Device, variant: str = "dark"):
-        super().__init__("question-icon", "<b>Help</b>", variant)
+        super().__init__("question-icon", "Help", variant, bold=True)
         self.device = device
 
     async def widget_action(self, *_args):
@@ -474,13 +564,15 @@ class HelpWidget(ActionableWidget, SimpleActionWidget):
 
 
 class DeviceHeaderWidget(Gtk.Box, ActionableWidget):
+    _PARENT_TEMPLATE = "This device is a child of <b>{}</b>"
+
     def __init__(self, device: backend.Device, variant: str = "dark"):
         """General information about the device - name, in the future also
         a button to rename the device."""
         super().__init__(orientation=Gtk.Orientation.VERTICAL)
         self.device_label = Gtk.Label()
-        self.device_label.set_markup(device.name)
-        self.device_label.get_style_context().add_class("device_name")
+        self.device_label.set_text(device.name)
+        _add_classes(self.device_label, "device_name")
         self.device_label.set_xalign(Gtk.Align.CENTER)
         self.device_label.set_halign(Gtk.Align.CENTER)
 
@@ -494,7 +586,7 @@ class DeviceHeaderWidget(Gtk.Box, ActionableWidget):
             parent_label = Gtk.Label()
             parent_label.set_halign(Gtk.Align.CENTER)
             parent_label.set_markup(
-                "This device is a child of <b>" + str(device.parent) + "</b>"
+                self._PARENT_TEMPLATE.format(escape(str(device.parent)))
             )
             self.add(parent_label)
 
@@ -502,10 +594,10 @@ class DeviceHeaderWidget(Gtk.Box, ActionableWidget):
             mic_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL)
             mic_label = Gtk.Label()
             if device.device_class == "mic":
-                mic_label.set_markup("This device will attach with camera ")
+                mic_label.set_text("This device will attach with camera ")
                 mic_box.add(mic_label)
             else:
-                mic_label.set_markup("This device will attach with microphone ")
+                mic_label.set_text("This device will attach with microphone ")
                 mic_box.add(mic_label)
             mic_img = VariantIcon(
                 "camera" if device.device_class == "mic" else "mic", variant, 18
@@ -526,7 +618,20 @@ class MainDeviceWidget(ActionableWidget, Gtk.Grid):
     |          | backend_vm | (arrow) | frontend_vm[s] |
     """
 
-    def __init__(self, device: backend.Device, variant: str = "dark"):
+    _NEW_SUFFIX = ' <span foreground="#63a0ff"><b>NEW</b></span>'
+
+    def __init__(
+        self,
+        device: backend.Device,
+        variant: str = "dark",
+        now: Optional[float] = None,
+    ):
+        """
+        :param device: Device object
+        :param variant: light / dark string
+        :param now: current time.monotonic() value; pass it when creating
+        many widgets at once
+        """
         super().__init__()
         self.device = device
         self.variant = variant
@@ -536,7 +641,7 @@ class MainDeviceWidget(ActionableWidget, Gtk.Grid):
         # reduce NEW! label timeout to 2 minutes after 1st view
         self._new_device_label_afterview = 2 * 60
 
-        self.get_style_context().add_class("main_device_item")
+        _add_classes(self, "main_device_item")
 
         # the part that is common to all devices
 
@@ -545,18 +650,19 @@ class MainDeviceWidget(ActionableWidget, Gtk.Grid):
 
         self.device_label = Gtk.Label(xalign=0)
 
-        label_markup = device.name
-        if (
-            device.connection_timestamp
-            and int(time.monotonic() - device.connection_timestamp) < 120
-        ):
-            label_markup += ' <span foreground="#63a0ff"><b>NEW</b></span>'
-        self.device_label.set_markup(label_markup)
+        label_markup = escape(device.name)
+        timestamp = device.connection_timestamp
+        if timestamp:
+            if now is None:
+                now = time.monotonic()
+            if now - timestamp < NEW_DEVICE_WINDOW_SEC:
+                label_markup += self._NEW_SUFFIX
+        _set_label(self.device_label, label_markup)
 
         if self.device.attachments:
-            self.device_label.get_style_context().add_class("dev_attached")
-
-        self.device_label.get_style_context().add_class("main_device_label")
+            _add_classes(self.device_label, "dev_attached", "main_device_label")
+        else:
+            _add_classes(self.device_label, "main_device_label")
 
         self.attach(self.device_icon, 0, 0, 1, 1)
         self.attach(self.device_label, 1, 0, 3, 1)
@@ -569,20 +675,28 @@ class MainDeviceWidget(ActionableWidget, Gtk.Grid):
         Get type-appropriate list of child widgets.
         :return: iterable of ActionableWidgets, ready to be packed in somewhere
         """
+        is_light = self.variant == "light"
+        prefetch_icons(
+            (name, is_light)
+            for name in (self.device.device_icon, "mic", "camera", *COMMON_ICONS)
+        )
 
-        attached_vms = [vm for vm in vms if vm in self.device.attachments]
-        assigned_vms = [
-            vm
-            for vm in vms
-            if vm in self.device.assignments and vm not in self.device.attachments
-        ]
-        other_vms = [
-            vm
-            for vm in vms
-            if vm not in self.device.attachments
-            and vm not in self.device.assignments
-            and vm.name != self.device.backend_domain.name
-        ]
+        # snapshot device state once instead of re-reading it for every vm
+        attachments = frozenset(self.device.attachments)
+        assignments = frozenset(self.device.assignments)
+        backend_name = self.device.backend_domain.name
+        attach_with_me = bool(self.device.devices_to_attach_with_me)
+
+        attached_vms: List[backend.VM] = []
+        assigned_vms: List[backend.VM] = []
+        other_vms: List[backend.VM] = []
+        for vm in vms:
+            if vm in attachments:
+                attached_vms.append(vm)
+            elif vm in assignments:
+                assigned_vms.append(vm)
+            elif vm.name != backend_name:
+                other_vms.append(vm)
 
         # all devices have a header
         yield DeviceHeaderWidget(self.device, self.variant)
@@ -594,7 +708,7 @@ class MainDeviceWidget(ActionableWidget, Gtk.Grid):
                 yield DetachWidget(vm, self.device, self.variant)
                 if vm.should_be_cleaned_up:
                     yield DetachAndShutdownWidget(vm, self.device, self.variant)
-                if self.device.devices_to_attach_with_me:
+                if attach_with_me:
                     yield DetachWithWidget(vm, self.device, self.variant)
             yield SeparatorItem()
 
@@ -639,7 +753,10 @@ def generate_wrapper_widget(
     widget_class: Callable, signal: str, inside_widget: ActionableWidget
 ):
     """
-    Wraps a provided
+    Wraps a provided ActionableWidget in a widget_class widget.
+    Widget actions are scheduled as asyncio tasks straight from the GTK signal
+    handler, so the asyncio loop must be driven by the GLib main loop (see
+    GLibEventLoopPolicy / gbulb setup in device_widget) rather than polled.
     :param widget_class: "outside" widget class, e.g. Gtk.MenuItem
     :param signal: name of the signal to which we should connect widget actions
     :param inside_widget: inner widget
@@ -647,10 +764,12 @@ def generate_wrapper_widget(
     """
     widget = widget_class()
     widget.add(inside_widget)
-
-    def run_async(func, *_args):
-        asyncio.create_task(func())
-
-    widget.connect(signal, functools.partial(run_async, inside_widget.widget_action))
+    widget.connect(signal, _run_widget_action, inside_widget.widget_action)
     widget.set_sensitive(inside_widget.actionable)
     return widget
+
+
+def _run_widget_action(_widget, action: Callable):
+    task = asyncio.create_task(action())
+    _TASKS.add(task)
+    task.add_done_callback(_TASKS.discard)
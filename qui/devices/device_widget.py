@@ -42,7 +42,7 @@ import qui.utils
 import gi
 
 gi.require_version("Gtk", "3.0")  # isort:skip
-from gi.repository import Gtk, Gdk, Gio  # isort:skip
+from gi.repository import Gtk, Gdk, Gio, GLib  # isort:skip
 
 try:
     from gi.events import GLibEventLoopPolicy
@@ -69,7 +69,8 @@ DEV_TYPES = ["block", "usb", "mic", "webcam"]
 
 
 class DeviceMenu(Gtk.Menu):
-    """Menu for handling a single device"""
+    """Menu for handling a single device. Its items are created only when
+    the menu is about to be used, see populate()."""
 
     def __init__(
         self,
@@ -78,26 +79,46 @@ class DeviceMenu(Gtk.Menu):
         dispvm_templates: List[backend.VM],
     ):
         super().__init__()
+        self.main_item = main_item
+        self.vms = vms
+        self.dispvm_templates = dispvm_templates
+        self.populated = False
+
+    def populate(self, *_args):
+        """Create menu items, if it was not done yet. Should be connected
+        to the 'select' signal of the parent menu item."""
+        if self.populated:
+            return
+        self.populated = True
 
-        for child_widget in main_item.get_child_widgets(vms, dispvm_templates):
+        for child_widget in self.main_item.get_child_widgets(
+            self.vms, self.dispvm_templates
+        ):
             child_item = actionable_widgets.generate_wrapper_widget(
                 Gtk.MenuItem, "activate", child_widget
             )
             if hasattr(child_widget, "get_child_widgets"):
                 submenu = Gtk.Menu()
                 submenu.set_reserve_toggle_size(False)
-
-                for menu_item_widget in child_widget.get_child_widgets():
-                    menu_item = actionable_widgets.generate_wrapper_widget(
-                        Gtk.MenuItem, "activate", menu_item_widget
-                    )
-                    submenu.add(menu_item)
-                submenu.show_all()
                 child_item.set_submenu(submenu)
+                child_item.connect(
+                    "select", self._populate_submenu, submenu, child_widget
+                )
             self.add(child_item)
 
         self.show_all()
 
+    @staticmethod
+    def _populate_submenu(_menu_item, submenu: Gtk.Menu, child_widget):
+        if submenu.get_children():
+            return
+        for menu_item_widget in child_widget.get_child_widgets():
+            menu_item = actionable_widgets.generate_wrapper_widget(
+                Gtk.MenuItem, "activate", menu_item_widget
+            )
+            submenu.add(menu_item)
+        submenu.show_all()
+
 
 class DevicesTray(Gtk.Application):
     """Tray application for handling devices."""
@@ -205,6 +226,15 @@ class DevicesTray(Gtk.Application):
             "<b>Qubes Devices</b>\nView and manage devices."
         )
 
+        GLib.idle_add(self._warmup_icons)
+
+    @staticmethod
+    def _warmup_icons():
+        # theme variant is only known once the menu is realized, so do both
+        for variant in ("light", "dark"):
+            actionable_widgets.warmup_icon_cache(variant)
+        return False
+
     def _update_queue(self, vm, device, device_class):
         """Handle certain operations that should not be done too often."""
         # update children
@@ -720,6 +750,8 @@ class DevicesTray(Gtk.Application):
             key=lambda x: x.sorting_key,
         )
 
+        now = time.monotonic()
+
         for i, dev in enumerate(sorted_devices):
             if i == 0 or dev.device_group != sorted_devices[i - 1].device_group:
                 # add a header
@@ -730,7 +762,7 @@ class DevicesTray(Gtk.Application):
                 )
                 menu_items.append(menu_item)
 
-            device_widget = actionable_widgets.MainDeviceWidget(dev, theme)
+            device_widget = actionable_widgets.MainDeviceWidget(dev, theme, now)
             device_item = actionable_widgets.generate_wrapper_widget(
                 Gtk.MenuItem, "activate", device_widget
             )
@@ -739,6 +771,8 @@ class DevicesTray(Gtk.Application):
             device_menu = DeviceMenu(device_widget, sorted_vms, sorted_dispvms)
             device_menu.set_reserve_toggle_size(False)
             device_item.set_submenu(device_menu)
+            # per-qube items are only needed for submenus the user opens
+            device_item.connect("select", device_menu.populate)
 
             menu_items.append(device_item)
 
@@ -0,0 +1,179 @@
+# -*- encoding: utf8 -*-
+#
+# The Qubes OS Project, http://www.qubes-os.org
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 2.1 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License along
+# with this program; if not, see <http://www.gnu.org/licenses/>.
+"""Unit tests of the bookkeeping of the domains tray, without qubesd"""
+
+# pylint: disable=protected-access,redefined-outer-name
+from unittest import mock
+
+import pytest
+
+import gi
+
+gi.require_version("Gtk", "3.0")  # isort:skip
+
+from qui.tray import domains
+
+
+class MockVM:
+    """Stand-in for qubesadmin.vm.QubesVM; like the real one, it compares
+    and hashes by name"""
+
+    def __init__(self, name, klass="AppVM", template=None, state="Halted"):
+        self.name = name
+        self.klass = klass
+        self.template = template
+        self.state = state
+        self.features = {}
+
+    def get_power_state(self):
+        return self.state
+
+    def __str__(self):
+        return self.name
+
+    def __hash__(self):
+        return hash(self.name)
+
+    def __eq__(self, other):
+        return str(self) == str(other)
+
+    def __lt__(self, other):
+        return str(self) < str(other)
+
+
+class MockQapp:
+    def __init__(self):
+        self.local_name = "dom0"
+        self.domains = {"dom0": MockVM("dom0", klass="AdminVM", state="Running")}
+        self.log = mock.Mock()
+
+
+@pytest.fixture
+def tray():
+    with mock.patch.object(domains, "get_fullscreen_window_hack"), mock.patch.object(
+        domains.DomainTray, "register"
+    ):
+        app = domains.DomainTray(
+            "org.qubes.qui.tray.DomainsTest", MockQapp(), mock.Mock(), mock.Mock()
+        )
+    # header, as added by initialize_menu()
+    app.tray_menu.add(domains.DomainMenuItem(None, app, app.icon_cache))
+    return app
+
+
+def add_vm(tray, vm):
+    tray.qapp.domains[vm.name] = vm
+    tray.add_domain_item(None, None, vm)
+    return tray.menu_items[vm.name]
+
+
+def menu_names(tray):
+    # skip the header
+    return [item.vm.name for item in tray.tray_menu.get_children()[1:]]
+
+
+def test_add_remove_keeps_menu_sorted(tray):
+    for name in ("work", "banking", "personal", "vault"):
+        add_vm(tray, MockVM(name))
+    assert menu_names(tray) == ["banking", "personal", "vault", "work"]
+    assert tray._sorted_names == ["banking", "personal", "vault", "work"]
+
+    tray.remove_domain_item(None, None, tray.qapp.domains["personal"])
+    add_vm(tray, MockVM("mail"))
+    add_vm(tray, MockVM("anon"))
+    assert menu_names(tray) == ["anon", "banking", "mail", "vault", "work"]
+    assert tray._sorted_names == ["anon", "banking", "mail", "vault", "work"]
+    assert "personal" not in tray.menu_items
+
+
+def test_halted_qube_is_not_built(tray):
+    item = add_vm(tray, MockVM("work"))
+    assert not item.built
+    assert not item.get_visible()
+    # and its template is not looked up
+    assert "work" not in tray._template_of
+
+
+def test_template_change_moves_qube_in_index(tray):
+    fedora = add_vm(tray, MockVM("fedora", klass="TemplateVM")).vm
+    debian = add_vm(tray, MockVM("debian", klass="TemplateVM")).vm
+    work = add_vm(tray, MockVM("work", template=fedora)).vm
+
+    tray._ensure_template_indexed(work)
+    assert tray._template_of["work"] == "fedora"
+    assert tray._children_of == {"fedora": {"work"}}
+
+    work.template = debian
+    tray.property_change(work, "property-set:template")
+    assert tray._template_of["work"] == "debian"
+    assert tray._children_of == {"debian": {"work"}}
+
+    tray.remove_domain_item(None, None, work)
+    assert "work" not in tray._template_of
+    assert not tray._children_of
+
+
+def test_template_of_disposable_template_is_indexed(tray):
+    fedora = add_vm(tray, MockVM("fedora", klass="TemplateVM")).vm
+    dvm = add_vm(tray, MockVM("default-dvm", template=fedora)).vm
+    disp = add_vm(tray, MockVM("disp1234", klass="DispVM", template=dvm)).vm
+
+    # the disposable template itself is halted, but a qube is based on it
+    tray._ensure_template_indexed(disp)
+    assert tray._children_of == {"fedora": {"default-dvm"}, "default-dvm": {"disp1234"}}
+
+
+def test_queued_states_flush_once_with_last_value(tray):
+    work = MockVM("work")
+    item = add_vm(tray, work)
+
+    with mock.patch.object(domains, "GLib") as glib, mock.patch.object(
+        item, "update_state", return_value=True
+    ) as update_state:
+        tray.update_domain_item(work, "domain-pre-start")
+        tray.update_domain_item(work, "domain-start")
+        tray.update_domain_item(work, "domain-paused")
+
+        # tracked right away, applied to the widgets only once
+        assert item.power_state == "Paused"
+        glib.idle_add.assert_called_once()
+        update_state.assert_not_called()
+
+        flush = glib.idle_add.call_args[0][0]
+        flush()
+
+        update_state.assert_called_once_with("Paused")
+        assert not tray._pending_state
+
+        # a later update schedules a new flush
+        tray.update_domain_item(work, "domain-unpaused")
+        assert glib.idle_add.call_count == 2
+
+
+def test_stats_wait_for_menu_to_be_shown(tray):
+    work = MockVM("work")
+    item = add_vm(tray, work)
+
+    with mock.patch.object(domains, "GLib") as glib, mock.patch.object(
+        item, "update_stats"
+    ) as update_stats:
+        tray.update_stats(work, "vm-stats", memory_kb=1024, cpu_usage=3)
+        tray.update_stats(work, "vm-stats", memory_kb=2048, cpu_usage=5)
+        glib.idle_add.assert_not_called()
+
+        tray._apply_pending_stats()
+        update_stats.assert_called_once_with(2048, 5)
@@ -106,6 +106,8 @@ class DomainsWidgetTest(unittest.TestCase):
                 item = self.__find_menu_item(domain_to_start)
                 self.assertIsNotNone(item, "domain not listed as started")
                 self.assertIsNotNone(item, "item incorrectly not listed")
+                # submenus are built lazily, on selection
+                item.ensure_submenu()
                 self.assertIsInstance(
                     item.get_submenu(),
                     domains_widget.StartedMenu,
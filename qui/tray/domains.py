@@ -9,10 +9,14 @@ from .gtk3_xwayland_menu_dismisser import (
 )  # isort:skip
 
 import asyncio
+import bisect
 import os
 import sys
-import traceback
+import time
 import abc
+from html import escape
+from operator import attrgetter
+from types import MappingProxyType
 
 import gi  # isort:skip
 import qubesadmin
@@ -39,16 +43,29 @@ import gettext
 t = gettext.translation("desktop-linux-manager", fallback=True)
 _ = t.gettext
 
-STATE_DICTIONARY = {
-    "domain-pre-start": "Transient",
-    "domain-start": "Running",
-    "domain-start-failed": "Halted",
-    "domain-paused": "Paused",
-    "domain-unpaused": "Running",
-    "domain-shutdown": "Halted",
-    "domain-pre-shutdown": "Transient",
-    "domain-shutdown-failed": "Running",
-}
+# event name -> domain state, read-only
+STATE_DICTIONARY = MappingProxyType(
+    {
+        "domain-pre-start": "Transient",
+        "domain-start": "Running",
+        "domain-start-failed": "Halted",
+        "domain-paused": "Paused",
+        "domain-unpaused": "Running",
+        "domain-shutdown": "Halted",
+        "domain-pre-shutdown": "Transient",
+        "domain-shutdown-failed": "Running",
+    }
+)
+
+XEN_CONSOLE_LOG_DIR = "/var/log/xen/console"
+# how long a listing of XEN_CONSOLE_LOG_DIR is trusted, in seconds
+LOG_DIR_CACHE_SEC = 5.0
+# how long a restart waits for the domain-shutdown event before checking
+# the power state again, in seconds
+RESTART_CHECK_SEC = 60.0
+# minimum age of the storage info in a qube tooltip before it is fetched
+# again, in seconds
+TOOLTIP_REFRESH_SEC = 120.0
 
 class IconCache:
     def __init__(self):
@@ -65,13 +82,162 @@ class IconCache:
             "logs": "scroll-text",
         }
 
-        self.images = {}
+        # surfaces, not Gtk.Images: a widget can only have one parent, but
+        # a surface can back any number of images
+        self.surfaces = {}
+        # cached icons are rendered from the theme, which can change
+        Gtk.IconTheme.get_default().connect("changed", self._clear)
+        # the set of icons is small and fixed; load them all up front
+        for icon_name in self.icon_files:
+            self.get_surface(icon_name)
+
+    def _clear(self, *_args):
+        self.surfaces.clear()
+
+    @staticmethod
+    def _scale_factor():
+        display = Gdk.Display.get_default()
+        if display is None:
+            return 1
+        monitor = display.get_primary_monitor() or display.get_monitor(0)
+        return monitor.get_scale_factor() if monitor else 1
+
+    def get_surface(self, icon_name, size=Gtk.IconSize.MENU):
+        # rendered at the scale of the screen, to stay sharp on HiDPI
+        scale = self._scale_factor()
+        key = (icon_name, size, scale)
+        if key not in self.surfaces:
+            _valid, pixel_size, _height = Gtk.icon_size_lookup(size)
+            try:
+                surface = Gtk.IconTheme.get_default().load_surface(
+                    self.icon_files[icon_name], pixel_size, scale, None, 0
+                )
+            except GLib.Error:
+                surface = None
+            self.surfaces[key] = surface
+        return self.surfaces[key]
 
     def get_image(self, icon_name):
         icon = self.icon_files.get(icon_name)
         if not icon:
             return Gtk.Image()  # empty placeholder
-        return Gtk.Image.new_from_icon_name(icon, Gtk.IconSize.MENU)
+        surface = self.get_surface(icon_name)
+        if surface is None:
+            return Gtk.Image.new_from_icon_name(icon, Gtk.IconSize.MENU)
+        return Gtk.Image.new_from_surface(surface)
+
+
+def spawn_detached(*argv):
+    """Start a program whose output and exit status are not needed, without
+    involving asyncio; the child is reaped from the GLib main loop."""
+    pid, *_fds = GLib.spawn_async(
+        list(argv),
+        flags=GLib.SpawnFlags.SEARCH_PATH | GLib.SpawnFlags.DO_NOT_REAP_CHILD,
+    )
+    GLib.child_watch_add(
+        GLib.PRIORITY_DEFAULT, pid, lambda pid, _status: GLib.spawn_close_pid(pid)
+    )
+
+
+# action: (title, message) of the error shown when it fails; the message
+# is formatted with the qube name and the error, see show_action_error()
+ERROR_TEMPLATES = MappingProxyType(
+    {
+        "pause": (
+            _("Error pausing qube"),
+            _(
+                "The following error occurred while "
+                "attempting to pause qube {0}:\n{1}"
+            ),
+        ),
+        "unpause": (
+            _("Error unpausing qube"),
+            _(
+                "The following error occurred while attempting "
+                "to unpause qube {0}:\n{1}"
+            ),
+        ),
+        "shutdown": (
+            _("Error shutting down qube"),
+            _(
+                "The following error occurred while attempting to "
+                "shut down qube {0}:\n{1}"
+            ),
+        ),
+        "restart": (
+            _("Error restarting qube"),
+            _(
+                "The following error occurred while attempting to restart"
+                "qube {0}:\n{1}"
+            ),
+        ),
+        "kill": (
+            _("Error shutting down qube"),
+            _(
+                "The following error occurred while attempting to shut"
+                "down qube {0}:\n{1}"
+            ),
+        ),
+        "terminal": (
+            _("Error starting terminal"),
+            _(
+                "The following error occurred while attempting to "
+                "run terminal {0}:\n{1}"
+            ),
+        ),
+        "file-manager": (
+            _("Error opening file manager"),
+            _(
+                "The following error occurred while attempting to "
+                "open file manager {0}:\n{1}"
+            ),
+        ),
+    }
+)
+
+
+# event: (body, priority, whether to show a warning icon) of the status
+# notification; the body is formatted with the qube name and the reason
+NOTIFICATION_SPECS = MappingProxyType(
+    {
+        "domain-start-failed": (
+            _("Qube {} has failed to start: {}"),
+            Gio.NotificationPriority.HIGH,
+            True,
+        ),
+        "domain-pre-start": (
+            _("Qube {} is starting."),
+            Gio.NotificationPriority.NORMAL,
+            False,
+        ),
+        "domain-start": (
+            _("Qube {} has started."),
+            Gio.NotificationPriority.NORMAL,
+            False,
+        ),
+        "domain-preload-dispvm-used": (
+            _("Qube {} was preloaded and is now being used."),
+            Gio.NotificationPriority.NORMAL,
+            False,
+        ),
+        "domain-pre-shutdown": (
+            _("Qube {} is attempting to shut down."),
+            Gio.NotificationPriority.NORMAL,
+            False,
+        ),
+        "domain-shutdown": (
+            _("Qube {} has shut down."),
+            Gio.NotificationPriority.NORMAL,
+            False,
+        ),
+        "domain-shutdown-failed": (
+            _("Qube {} failed to shut down: {}"),
+            Gio.NotificationPriority.HIGH,
+            True,
+        ),
+    }
+)
+
 
 def show_error(title, text):
     dialog = Gtk.MessageDialog(None, 0, Gtk.MessageType.ERROR, Gtk.ButtonsType.OK)
@@ -81,6 +247,11 @@ def show_error(title, text):
     GLib.idle_add(dialog.show)
 
 
+def show_action_error(action, vm, ex):
+    title, message = ERROR_TEMPLATES[action]
+    show_error(title, message.format(escape(vm.name), escape(str(ex))))
+
+
 class ABCGtkMenuItemMeta(abc.ABCMeta, type(Gtk.MenuItem)):
     pass
 
@@ -135,6 +306,70 @@ class VMActionMenuItem(ActionMenuItem):
         self.vm = vm
 
 
+class SpawnMenuItem(ActionMenuItem):
+    """Base for items which only start a program; that is done right in the
+    signal handler, instead of in an asyncio task. Subclasses implement
+    command()."""
+
+    # pylint: disable=abstract-method
+    @abc.abstractmethod
+    def command(self):
+        """Argument list of the program to start."""
+
+    async def perform_action(self):
+        spawn_detached(*self.command())
+
+    def on_activate(self, *_args, **_kwargs):
+        spawn_detached(*self.command())
+
+
+class ForceableMenuItem(VMActionMenuItem):
+    """Base for items which, if the qube does not shut down normally, ask
+    whether to force it. The question dialog is built once per item and
+    reused; subclasses implement react_to_question."""
+
+    # pylint: disable=abstract-method
+    _DIALOG_TITLE = ""
+    _MSG_TEMPLATE = (
+        "The qube {name} couldn't be shut down "
+        "normally. The following error occurred: \n"
+        "<tt>{error}</tt>\n\n"
+        "Do you want to force shutdown? \n\n<b>Warning:</b> "
+        "this may cause unexpected issues in connected qubes."
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._confirm_dialog = None
+        self.connect("destroy", self._destroy_dialog)
+
+    def ask_to_force(self, ex):
+        if self._confirm_dialog is None:
+            self._confirm_dialog = Gtk.MessageDialog(
+                None, 0, Gtk.MessageType.ERROR, Gtk.ButtonsType.OK_CANCEL
+            )
+            self._confirm_dialog.set_title(self._DIALOG_TITLE)
+            self._confirm_dialog.connect("response", self.react_to_question)
+            # the dialog is reused, closing the window must only hide it
+            self._confirm_dialog.connect(
+                "delete-event", lambda dialog, _event: dialog.hide_on_delete()
+            )
+            self._confirm_dialog.connect("destroy", self._forget_dialog)
+        self._confirm_dialog.set_markup(
+            self._MSG_TEMPLATE.format(name=escape(self.vm.name), error=escape(str(ex)))
+        )
+        GLib.idle_add(self._confirm_dialog.show)
+
+    def _forget_dialog(self, dialog):
+        if self._confirm_dialog is dialog:
+            self._confirm_dialog = None
+
+    def _destroy_dialog(self, *_args):
+        if self._confirm_dialog is not None:
+            self._confirm_dialog.destroy()
+            self._confirm_dialog = None
+
+
 class PauseItem(VMActionMenuItem):
     """Shutdown menu Item. When activated pauses the domain."""
 
@@ -150,13 +385,7 @@ class PauseItem(VMActionMenuItem):
         try:
             self.vm.pause()
         except exc.QubesException as ex:
-            show_error(
-                _("Error pausing qube"),
-                _(
-                    "The following error occurred while "
-                    "attempting to pause qube {0}:\n{1}"
-                ).format(self.vm.name, str(ex)),
-            )
+            show_action_error("pause", self.vm, ex)
 
 
 class UnpauseItem(VMActionMenuItem):
@@ -171,18 +400,14 @@ class UnpauseItem(VMActionMenuItem):
         try:
             self.vm.unpause()
         except exc.QubesException as ex:
-            show_error(
-                _("Error unpausing qube"),
-                _(
-                    "The following error occurred while attempting "
-                    "to unpause qube {0}:\n{1}"
-                ).format(self.vm.name, str(ex)),
-            )
+            show_action_error("unpause", self.vm, ex)
 
 
-class ShutdownItem(VMActionMenuItem):
+class ShutdownItem(ForceableMenuItem):
     """Shutdown menu Item. When activated shutdowns the domain."""
 
+    _DIALOG_TITLE = "Error shutting down qube"
+
     def __init__(self, vm, icon_cache, force=False):
         if force:
             super().__init__(
@@ -209,48 +434,30 @@ class ShutdownItem(VMActionMenuItem):
             self.vm.shutdown(force=self.force)
         except exc.QubesException as ex:
             if self.force:
-                show_error(
-                    _("Error shutting down qube"),
-                    _(
-                        "The following error occurred while attempting to "
-                        "shut down qube {0}:\n{1}"
-                    ).format(self.vm.name, str(ex)),
-                )
+                show_action_error("shutdown", self.vm, ex)
                 return
-            dialog = Gtk.MessageDialog(
-                None, 0, Gtk.MessageType.ERROR, Gtk.ButtonsType.OK_CANCEL
-            )
-            dialog.set_title("Error shutting down qube")
-            dialog.set_markup(
-                f"The qube {self.vm.name} couldn't be shut down "
-                "normally. The following error occurred: \n"
-                f"<tt>{str(ex)}</tt>\n\n"
-                "Do you want to force shutdown? \n\n<b>Warning:</b> "
-                "this may cause unexpected issues in connected qubes."
-            )
-            dialog.connect("response", self.react_to_question)
-            GLib.idle_add(dialog.show)
+            self.ask_to_force(ex)
 
     def react_to_question(self, widget, response):
         if response == Gtk.ResponseType.OK:
             try:
                 self.vm.shutdown(force=True)
             except exc.QubesException as ex:
-                show_error(
-                    _("Error shutting down qube"),
-                    _(
-                        "The following error occurred while attempting to "
-                        "shut down qube {0}:\n{1}"
-                    ).format(self.vm.name, str(ex)),
-                )
-        widget.destroy()
+                show_action_error("shutdown", self.vm, ex)
+        widget.hide()
 
 
-class RestartItem(VMActionMenuItem):
+class RestartItem(ForceableMenuItem):
     """Restart menu Item. When activated shutdowns the domain and
     then starts it again."""
 
-    def __init__(self, vm, icon_cache, force=False):
+    _DIALOG_TITLE = "Error restarting qube"
+
+    def __init__(self, vm, icon_cache, force=False, shutdown_event=None):
+        """
+        :param shutdown_event: asyncio.Event set when the qube shuts down,
+        see DomainTray.get_shutdown_event()
+        """
         if force:
             super().__init__(
                 vm, label=_("Force restart"), icon_cache=icon_cache, icon_name="restart"
@@ -261,6 +468,7 @@ class RestartItem(VMActionMenuItem):
             )
         self.force = force
         self.give_up = False
+        self.shutdown_event = shutdown_event or asyncio.Event()
 
     def set_force(self, force):
         self.force = force
@@ -270,38 +478,28 @@ class RestartItem(VMActionMenuItem):
             self.label.set_text(_("Restart"))
 
     async def perform_action(self, *_args, **_kwargs):
+        self.give_up = False
+        self.shutdown_event.clear()
         try:
             self.vm.shutdown(force=self.force)
         except exc.QubesException as ex:
             if self.force:
                 # we already tried forcing it, let's just give up
-                show_error(
-                    _("Error restarting qube"),
-                    _(
-                        "The following error occurred while attempting to restart"
-                        "qube {0}:\n{1}"
-                    ).format(self.vm.name, str(ex)),
-                )
+                show_action_error("restart", self.vm, ex)
                 return
-            dialog = Gtk.MessageDialog(
-                None, 0, Gtk.MessageType.ERROR, Gtk.ButtonsType.OK_CANCEL
-            )
-            dialog.set_title("Error restarting qube")
-            dialog.set_markup(
-                f"The qube {self.vm.name} couldn't be shut down "
-                "normally. The following error occurred: \n"
-                f"<tt>{str(ex)}</tt>\n\n"
-                "Do you want to force shutdown? \n\n<b>Warning:</b> "
-                "this may cause unexpected issues in connected qubes."
-            )
-            dialog.connect("response", self.react_to_question)
-            GLib.idle_add(dialog.show)
+            self.ask_to_force(ex)
 
         try:
             while self.vm.is_running():
                 if self.give_up:
                     return
-                await asyncio.sleep(1)
+                self.shutdown_event.clear()
+                try:
+                    await asyncio.wait_for(
+                        self.shutdown_event.wait(), RESTART_CHECK_SEC
+                    )
+                except asyncio.TimeoutError:
+                    pass
             proc = await asyncio.create_subprocess_exec(
                 "qvm-start", self.vm.name, stderr=asyncio.subprocess.PIPE
             )
@@ -309,30 +507,21 @@ class RestartItem(VMActionMenuItem):
             if proc.returncode != 0:
                 raise exc.QubesException(stderr)
         except exc.QubesException as ex:
-            show_error(
-                _("Error restarting qube"),
-                _(
-                    "The following error occurred while attempting to restart"
-                    "qube {0}:\n{1}"
-                ).format(self.vm.name, str(ex)),
-            )
+            show_action_error("restart", self.vm, ex)
 
     def react_to_question(self, widget, response):
         if response == Gtk.ResponseType.OK:
             try:
                 self.vm.shutdown(force=True)
             except exc.QubesException as ex:
-                show_error(
-                    _("Error shutting down qube"),
-                    _(
-                        "The following error occurred while attempting to "
-                        "shut down qube {0}:\n{1}"
-                    ).format(self.vm.name, str(ex)),
-                )
+                show_action_error("shutdown", self.vm, ex)
                 self.give_up = True
         else:
             self.give_up = True
-        widget.destroy()
+        if self.give_up:
+            # wake up perform_action, so it notices
+            self.shutdown_event.set()
+        widget.hide()
 
 
 class KillItem(VMActionMenuItem):
@@ -345,16 +534,10 @@ class KillItem(VMActionMenuItem):
         try:
             self.vm.kill()
         except exc.QubesException as ex:
-            show_error(
-                _("Error shutting down qube"),
-                _(
-                    "The following error occurred while attempting to shut"
-                    "down qube {0}:\n{1}"
-                ).format(self.vm.name, str(ex)),
-            )
+            show_action_error("kill", self.vm, ex)
 
 
-class PreferencesItem(VMActionMenuItem):
+class PreferencesItem(SpawnMenuItem, VMActionMenuItem):
     """Preferences menu Item. When activated shows preferences dialog"""
 
     def __init__(self, vm, icon_cache):
@@ -365,12 +548,11 @@ class PreferencesItem(VMActionMenuItem):
             icon_name="preferences",
         )
 
-    async def perform_action(self):
-        # pylint: disable=consider-using-with
-        await asyncio.create_subprocess_exec("qubes-vm-settings", self.vm.name)
+    def command(self):
+        return ["qubes-vm-settings", self.vm.name]
 
 
-class LogItem(ActionMenuItem):
+class LogItem(SpawnMenuItem):
     def __init__(self, name, path, icon_cache):
         super().__init__(
             label=name,
@@ -379,8 +561,8 @@ class LogItem(ActionMenuItem):
         )
         self.path = path
 
-    async def perform_action(self):
-        await asyncio.create_subprocess_exec("qubes-log-viewer", self.path)
+    def command(self):
+        return ["qubes-log-viewer", self.path]
 
 
 class RunTerminalItem(VMActionMenuItem):
@@ -412,16 +594,10 @@ class RunTerminalItem(VMActionMenuItem):
         try:
             self.vm.run_service("qubes.StartApp+qubes-run-terminal", **service_args)
         except exc.QubesException as ex:
-            show_error(
-                _("Error starting terminal"),
-                _(
-                    "The following error occurred while attempting to "
-                    "run terminal {0}:\n{1}"
-                ).format(self.vm.name, str(ex)),
-            )
+            show_action_error("terminal", self.vm, ex)
 
 
-class RunDebugConsoleItem(VMActionMenuItem):
+class RunDebugConsoleItem(SpawnMenuItem, VMActionMenuItem):
     """Run Debug Console menu Item. When activated runs a qvm-console-dispvm."""
 
     def __init__(self, vm, icon_cache):
@@ -440,9 +616,8 @@ class RunDebugConsoleItem(VMActionMenuItem):
         else:
             widget.hide()
 
-    async def perform_action(self):
-        # pylint: disable=consider-using-with
-        await asyncio.create_subprocess_exec("qvm-console-dispvm", self.vm.name)
+    def command(self):
+        return ["qvm-console-dispvm", self.vm.name]
 
 
 class OpenFileManagerItem(VMActionMenuItem):
@@ -461,13 +636,7 @@ class OpenFileManagerItem(VMActionMenuItem):
         try:
             self.vm.run_service("qubes.StartApp+qubes-open-file-manager")
         except exc.QubesException as ex:
-            show_error(
-                _("Error opening file manager"),
-                _(
-                    "The following error occurred while attempting to "
-                    "open file manager {0}:\n{1}"
-                ).format(self.vm.name, str(ex)),
-            )
+            show_action_error("file-manager", self.vm, ex)
 
 
 class InternalInfoItem(Gtk.MenuItem):
@@ -489,23 +658,29 @@ class InternalInfoItem(Gtk.MenuItem):
 class StartedMenu(Gtk.Menu):
     """The sub-menu for a started domain"""
 
-    def __init__(self, vm, app, icon_cache):
+    def __init__(self, vm, app):
         super().__init__()
         self.vm = vm
         self.app = app
 
-        self.add(OpenFileManagerItem(self.vm, icon_cache))
-        self.add(RunTerminalItem(self.vm, icon_cache, as_root=app.shift_pressed))
+        self.add(app.get_action_item(self.vm, OpenFileManagerItem))
+        self.add(app.get_action_item(self.vm, RunTerminalItem))
 
         # Debug console for developers, troubleshooting, headless qubes
-        self.debug_console = RunDebugConsoleItem(self.vm, icon_cache)
+        self.debug_console = app.get_action_item(self.vm, RunDebugConsoleItem)
         self.add(self.debug_console)
 
-        self.add(PreferencesItem(self.vm, icon_cache))
-        self.add(PauseItem(self.vm, icon_cache))
-        self.add(ShutdownItem(self.vm, icon_cache, force=app.shift_pressed))
-        if self.vm.klass != "DispVM" or not self.vm.auto_cleanup:
-            self.add(RestartItem(self.vm, icon_cache, force=app.shift_pressed))
+        self.add(app.get_action_item(self.vm, PreferencesItem))
+        self.add(app.get_action_item(self.vm, PauseItem))
+        self.add(app.get_action_item(self.vm, ShutdownItem))
+        if app.get_vm_flags(self.vm)["restartable"]:
+            self.add(
+                app.get_action_item(
+                    self.vm,
+                    RestartItem,
+                    shutdown_event=app.get_shutdown_event(self.vm),
+                )
+            )
 
         self.set_reserve_toggle_size(False)
         self.debug_console_update()
@@ -514,13 +689,7 @@ class StartedMenu(Gtk.Menu):
     def debug_console_update(self, *_args, **_kwargs):
         # Debug console is shown only if debug property is set, no GUIVM is set
         # ... or with `expert-mode` feature per qube or per entire GUIVM.
-        if (
-            self.app.expert_mode
-            or getattr(self.vm, "debug")
-            or not getattr(self.vm, "guivm")
-            or not self.vm.features.check_with_template("gui", False)
-            or self.vm.features.get("expert-mode", False)
-        ):
+        if self.app.expert_mode or self.app.get_vm_flags(self.vm)["debug_console"]:
             self.debug_console.visible = True
             self.debug_console.show()
         else:
@@ -531,13 +700,13 @@ class StartedMenu(Gtk.Menu):
 class PausedMenu(Gtk.Menu):
     """The sub-menu for a paused domain"""
 
-    def __init__(self, vm, icon_cache):
+    def __init__(self, vm, app):
         super().__init__()
         self.vm = vm
 
-        self.add(PreferencesItem(self.vm, icon_cache))
-        self.add(UnpauseItem(self.vm, icon_cache))
-        self.add(KillItem(self.vm, icon_cache))
+        self.add(app.get_action_item(self.vm, PreferencesItem))
+        self.add(app.get_action_item(self.vm, UnpauseItem))
+        self.add(app.get_action_item(self.vm, KillItem))
 
         self.set_reserve_toggle_size(False)
         self.show_all()
@@ -546,28 +715,28 @@ class PausedMenu(Gtk.Menu):
 class DebugMenu(Gtk.Menu):
     """Sub-menu providing multiple MenuItem for domain logs."""
 
-    def __init__(self, vm, icon_cache):
+    def __init__(self, vm, app):
         super().__init__()
         self.vm = vm
 
-        self.add(PreferencesItem(self.vm, icon_cache))
+        self.add(app.get_action_item(self.vm, PreferencesItem))
 
         logs = [
             (
                 _("Console Log"),
-                "/var/log/xen/console/guest-" + vm.name + ".log",
+                f"{XEN_CONSOLE_LOG_DIR}/guest-{vm.name}.log",
             ),
             (
                 _("QEMU Console Log"),
-                "/var/log/xen/console/guest-" + vm.name + "-dm.log",
+                f"{XEN_CONSOLE_LOG_DIR}/guest-{vm.name}-dm.log",
             ),
         ]
 
         for name, path in logs:
-            if os.path.isfile(path):
-                self.add(LogItem(name, path, icon_cache=icon_cache))
+            if app.log_exists(path):
+                self.add(LogItem(name, path, icon_cache=app.icon_cache))
 
-        self.add(KillItem(self.vm, icon_cache))
+        self.add(app.get_action_item(self.vm, KillItem))
 
         self.set_reserve_toggle_size(False)
         self.show_all()
@@ -576,10 +745,10 @@ class DebugMenu(Gtk.Menu):
 class InternalMenu(Gtk.Menu):
     """Sub-menu for Internal qubes"""
 
-    def __init__(self, vm, icon_cache, working_correctly=True):
+    def __init__(self, vm, app, working_correctly=True):
         """
         :param vm: relevant Internal qube
-        :param icon_cache: IconCache object
+        :param app: DomainTray object
         :param working_correctly: if True, the VM should have a Shutdown
         option; otherwise, have a Kill option
         """
@@ -591,22 +760,22 @@ class InternalMenu(Gtk.Menu):
         logs = [
             (
                 _("Console Log"),
-                "/var/log/xen/console/guest-" + vm.name + ".log",
+                f"{XEN_CONSOLE_LOG_DIR}/guest-{vm.name}.log",
             ),
             (
                 _("QEMU Console Log"),
-                "/var/log/xen/console/guest-" + vm.name + "-dm.log",
+                f"{XEN_CONSOLE_LOG_DIR}/guest-{vm.name}-dm.log",
             ),
         ]
 
         for name, path in logs:
-            if os.path.isfile(path):
-                self.add(LogItem(name, path, icon_cache=icon_cache))
+            if app.log_exists(path):
+                self.add(LogItem(name, path, icon_cache=app.icon_cache))
 
         if working_correctly:
-            self.add(ShutdownItem(self.vm, icon_cache))
+            self.add(app.get_action_item(self.vm, ShutdownItem))
         else:
-            self.add(KillItem(self.vm, icon_cache))
+            self.add(app.get_action_item(self.vm, KillItem))
 
         self.set_reserve_toggle_size(False)
         self.show_all()
@@ -638,14 +807,23 @@ class QubesManagerItem(Gtk.MenuItem):
         self.connect("activate", self.on_activate)
 
     def on_activate(self, *_args, **_kwargs):
-        asyncio.create_task(self.perform_action())
-
-    async def perform_action(self):
-        # pylint: disable=consider-using-with
-        await asyncio.create_subprocess_exec("qubes-qube-manager")
+        spawn_detached("qubes-qube-manager")
 
 
 class DomainMenuItem(Gtk.MenuItem):
+    # (internal, state) -> submenu factory, see _factory_key()
+    _SUBMENU_FACTORIES = {
+        (True, "Running"): lambda item: InternalMenu(
+            item.vm, item.app, working_correctly=True
+        ),
+        (True, None): lambda item: InternalMenu(
+            item.vm, item.app, working_correctly=False
+        ),
+        (False, "Running"): lambda item: StartedMenu(item.vm, item.app),
+        (False, "Paused"): lambda item: PausedMenu(item.vm, item.app),
+        (False, None): lambda item: DebugMenu(item.vm, item.app),
+    }
+
     def __init__(self, vm, app, icon_cache, state=None):
         super().__init__()
         self.vm = vm
@@ -653,12 +831,62 @@ class DomainMenuItem(Gtk.MenuItem):
         self.icon_cache = icon_cache
         self.decorator = qui.decorators.DomainDecorator(vm)
 
+        # last known power state and whether it is ignored when checking if
+        # all qubes are paused; both maintained by DomainTray
+        self.power_state = state
+        self.skip_pause_check = True
+
+        # cached "internal" feature, refreshed by DomainTray.internal_change
+        self._internal = False
+        if self.vm is not None:
+            try:
+                self._internal = bool(self.vm.features.get("internal", False))
+            except exc.QubesException:
+                pass
+
+        # submenus are only built when the item is selected, see
+        # _set_submenu(); _SUBMENU_FACTORIES key of the current/pending one
+        self._submenu_key = None
+        self._pending_submenu = None
+        self.connect("select", self.ensure_submenu)
+
+        # the widgets of a halted qube are hidden anyway; they are built,
+        # with the RPCs their labels and tooltips need, only once the qube
+        # leaves the Halted state (see update_state())
+        self.built = False
+        self.storage_dirty = False
+        # state the widgets currently show, see update_state()
+        self._shown_state = None
+
+        if self.vm is None:  # if header
+            self._build_widgets()
+            self.set_reserve_indicator(True)  # align with submenu triangles
+            self.cpu.update_state(header=True)
+            self.memory.update_state(header=True)
+            self.show_all()  # header should always be visible
+        else:
+            if self.vm.klass == "AdminVM":  # no submenu for AdminVM
+                self._build_widgets()
+                self.set_reserve_indicator(True)  # align with submenu triangles
+            else:
+                if not state:
+                    state = self.vm.get_power_state()
+                    self.power_state = state
+                self.update_state(state)
+
+    def _build_widgets(self):
+        self.built = True
+
         # Main horizontal box
         self.hbox = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL)
 
         # Icon box with fixed width
         self.iconbox = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL)
         self.iconbox.set_size_request(16, 0)
+        # the image is kept and only its icon changes, see set_label_icon()
+        self.icon_image = Gtk.Image()
+        self.iconbox.pack_start(self.icon_image, False, True, 0)
+        self._current_icon_name = None
         self.set_label_icon()
 
         self.hbox.pack_start(self.iconbox, False, True, 6)
@@ -667,6 +895,11 @@ class DomainMenuItem(Gtk.MenuItem):
         namebox = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL)
         self.name = self.decorator.name()
         namebox.pack_start(self.name, False, True, 0)
+        if self.vm is not None:
+            # storage info is only refreshed when the tooltip is shown: if
+            # an event marked it dirty, or if it is old and can have changed
+            self._tooltip_refreshed = time.monotonic()
+            self.name.label.connect("query-tooltip", self._on_query_tooltip)
         self.spinner = Gtk.Spinner()
         namebox.pack_start(self.spinner, False, True, 0)
 
@@ -684,33 +917,51 @@ class DomainMenuItem(Gtk.MenuItem):
         # Add hbox to the menu item
         self.add(self.hbox)
 
-        if self.vm is None:  # if header
-            self.set_reserve_indicator(True)  # align with submenu triangles
-            self.cpu.update_state(header=True)
-            self.memory.update_state(header=True)
-            self.show_all()  # header should always be visible
-        else:
-            if self.vm.klass == "AdminVM":  # no submenu for AdminVM
-                self.set_reserve_indicator(True)  # align with submenu triangles
-            else:
-                if not state:
-                    self.update_state(self.vm.get_power_state())
-                else:
-                    self.update_state(state)
+    def _factory_key(self, state):
+        if self._internal:
+            return (True, "Running" if state == "Running" else None)
+        return (False, state if state in ("Running", "Paused") else None)
+
+    def set_internal(self, internal):
+        if internal == self._internal:
+            return
+        self._internal = internal
+        if self._submenu_key is not None:
+            # the submenu kind depends on the flag, not only on the state
+            self._set_submenu(self.power_state)
 
     def _set_submenu(self, state):
-        if self.vm.features.get("internal", False):
-            submenu = InternalMenu(
-                self.vm, self.icon_cache, working_correctly=(state == "Running")
-            )
-        elif state == "Running":
-            submenu = StartedMenu(self.vm, self.app, self.icon_cache)
-        elif state == "Paused":
-            submenu = PausedMenu(self.vm, self.icon_cache)
+        """Mark the submenu for rebuilding; the actual menu is constructed
+        only once the item is selected (see ensure_submenu()), because at
+        most one of the many submenus is ever looked at."""
+        key = self._factory_key(state)
+        if key == self._submenu_key:
+            return
+        self._submenu_key = key
+
+        current_submenu = self.get_submenu()
+        if current_submenu is not None and current_submenu.get_visible():
+            # submenu is open right now, replace it immediately
+            self._pending_submenu = key
+            self.ensure_submenu()
+        elif self._pending_submenu is None:
+            # empty placeholder keeps the submenu arrow in place
+            self._pending_submenu = key
+            self._replace_submenu(Gtk.Menu())
         else:
-            submenu = DebugMenu(self.vm, self.icon_cache)
+            self._pending_submenu = key
+
+    def ensure_submenu(self, *_args):
+        """Build the submenu, if it is pending. Connected to 'select'."""
+        if self._pending_submenu is None:
+            return
+        submenu = self._SUBMENU_FACTORIES[self._pending_submenu](self)
+        self._pending_submenu = None
         submenu.connect("key-press-event", self.app.key_event)
         submenu.connect("key-release-event", self.app.key_event)
+        self._replace_submenu(submenu)
+
+    def _replace_submenu(self, submenu):
         # This is a workaround for a bug in Gtk which occurs when a
         # submenu is replaced while it is open.
         # see https://gitlab.gnome.org/GNOME/gtk/issues/885
@@ -731,22 +982,39 @@ class DomainMenuItem(Gtk.MenuItem):
         self.spinner.hide()
 
     def update_state(self, state):
+        """Update the item to show the given power state. Returns whether
+        anything had to be changed."""
         vm_klass = getattr(self.vm, "klass", None)
 
         if not self.vm or vm_klass == "AdminVM":
             # it's a header or an AdminVM, no need to do anything
-            return
+            return False
+
+        if state == self._shown_state and (
+            state == "Halted" or self._factory_key(state) == self._submenu_key
+        ):
+            # several events can report the same state, e.g. the state
+            # is confirmed on reconnection; the submenu kind also depends
+            # on the "internal" feature, so it is checked separately
+            return False
+
+        # if VM is not running, hide it; its submenu is not needed until
+        # it starts again
+        if state == "Halted":
+            self.hide()
+            self._shown_state = state
+            return True
+
+        if not self.built:
+            self._build_widgets()
 
         if not vm_klass:
             # it's a DispVM in a very fragile state; just make sure to add
-            # correct submenu
+            # correct submenu; not recorded as shown, the rest has to be
+            # updated once the qube is fully available
             self._set_submenu(state)
-            return
+            return True
 
-        # if VM is not running, hide it
-        if state == "Halted":
-            self.hide()
-            return
         self.show_all()
 
         if state in ["Running", "Paused"]:
@@ -762,21 +1030,42 @@ class DomainMenuItem(Gtk.MenuItem):
             self.name.label.set_label(self.vm.name)
 
         self._set_submenu(state)
+        self._shown_state = state
+        return True
+
+    def _on_query_tooltip(self, label, _x, _y, _keyboard_mode, tooltip):
+        now = time.monotonic()
+        if self.storage_dirty or (
+            # a qube that is not running does not write to its storage
+            self.power_state == "Running"
+            and now - self._tooltip_refreshed > TOOLTIP_REFRESH_SEC
+        ):
+            self._tooltip_refreshed = now
+            self.storage_dirty = False
+            try:
+                self.name.update_tooltip(storage_changed=True)
+            except Exception:  # pylint: disable=broad-except
+                pass
+        tooltip.set_markup(label.get_tooltip_markup())
+        return True
 
     def update_stats(self, memory_kb, cpu_usage):
+        if not self.built:
+            return
         self.memory.update_state(int(memory_kb))
         self.cpu.update_state(int(cpu_usage))
 
     def set_label_icon(self):
-        for child in self.iconbox.get_children():
-            self.iconbox.remove(child)
-        icon = self.decorator.icon()
-        if icon:
-            self.iconbox.pack_start(icon, False, True, 0)
-            icon.show()
+        icon_name = self.decorator.icon_name()
+        if icon_name == self._current_icon_name:
+            return
+        self._current_icon_name = icon_name
+        if icon_name:
+            self.icon_image.set_from_icon_name(icon_name, Gtk.IconSize.MENU)
+            self.icon_image.show()
         else:
-            placeholder = Gtk.Label()
-            self.iconbox.pack_start(placeholder, False, True, 0)
+            # header: empty image as a placeholder
+            self.icon_image.clear()
 
 
 class DomainTray(Gtk.Application):
@@ -805,14 +1094,36 @@ class DomainTray(Gtk.Application):
         self.icon_cache = IconCache()
 
         self.menu_items = {}
+        # names of non-AdminVM items, in menu order; see add_domain_item()
+        self._sorted_names = []
+        self._adminvm_count = 0
+        # template name: names of qubes based on it, and the reverse
+        self._children_of = {}
+        self._template_of = {}
+        self._state_lookup = STATE_DICTIONARY.get
+
+        self._log_dir_cache = {"ts": 0.0, "names": frozenset()}
+        # vm name: asyncio.Event set on domain-shutdown, used by RestartItem
+        self._shutdown_events = {}
+        # vm name: {item class: item}, see get_action_item()
+        self._action_pool = {}
+        # vm name: flags used by StartedMenu, see get_vm_flags()
+        self._vm_flags_cache = {}
+        # vm name: latest (event, state) and (memory_kb, cpu_usage) not yet
+        # applied to the menu items, see _flush_pending()
+        self._pending_state = {}
+        self._pending_stats = {}
+        self._flush_scheduled = False
 
         self.unpause_all_action = Gio.SimpleAction.new("do-unpause-all", None)
         self.unpause_all_action.connect("activate", self.do_unpause_all)
         self.add_action(self.unpause_all_action)
         self.pause_notification_out = False
-
-        # add refreshing tooltips with storage info
-        GLib.timeout_add_seconds(120, self.refresh_tooltips)
+        # (vm name, event): event kwargs, see emit_notification()
+        self._pending_notifications = {}
+        self._warning_icon = Gio.ThemedIcon.new("dialog-warning")
+        # (dispatcher, event, handler) of all registered handlers
+        self._handler_registrations = []
 
         self.register_events()
         self.set_application_id(app_name)
@@ -823,117 +1134,177 @@ class DomainTray(Gtk.Application):
             "expert-mode", False
         )
 
+    # event name: names of the methods handling it, in order
+    EVENT_TABLE = {
+        "connection-established": ("refresh_all",),
+        "domain-pre-start": ("update_domain_item", "emit_notification"),
+        "domain-start": (
+            "update_domain_item",
+            "emit_notification",
+            "check_pause_notify",
+        ),
+        "domain-start-failed": ("update_domain_item", "emit_notification"),
+        "domain-paused": ("update_domain_item", "check_pause_notify"),
+        "domain-unpaused": ("update_domain_item", "check_pause_notify"),
+        "domain-shutdown": (
+            "update_domain_item",
+            "emit_notification",
+            "check_pause_notify",
+        ),
+        "domain-pre-shutdown": ("update_domain_item", "emit_notification"),
+        "domain-shutdown-failed": ("update_domain_item", "emit_notification"),
+        "domain-add": ("add_domain_item",),
+        "domain-delete": ("remove_domain_item",),
+        "domain-preload-dispvm-used": ("emit_notification", "preload_used"),
+        "domain-feature-set:updates-available": ("feature_change",),
+        "domain-feature-delete:updates-available": ("feature_change",),
+        "property-set:netvm": ("property_change",),
+        "property-set:label": ("property_change",),
+        "property-set:template": ("property_change",),
+        "property-set:debug": ("debug_change",),
+        "property-set:guivm": ("debug_change",),
+        "domain-feature-set:gui": ("debug_change",),
+        "domain-feature-delete:gui": ("debug_change",),
+        "domain-feature-set:expert-mode": ("debug_change",),
+        "domain-feature-delete:expert-mode": ("debug_change",),
+        "domain-feature-set:internal": ("internal_change", "update_domain_item"),
+        "domain-feature-delete:internal": (
+            "internal_change",
+            "update_domain_item",
+        ),
+    }
+
     def register_events(self):
-        self.dispatcher.add_handler("connection-established", self.refresh_all)
-        self.dispatcher.add_handler("domain-pre-start", self.update_domain_item)
-        self.dispatcher.add_handler("domain-start", self.update_domain_item)
-        self.dispatcher.add_handler("domain-start-failed", self.update_domain_item)
-        self.dispatcher.add_handler("domain-paused", self.update_domain_item)
-        self.dispatcher.add_handler("domain-unpaused", self.update_domain_item)
-        self.dispatcher.add_handler("domain-shutdown", self.update_domain_item)
-        self.dispatcher.add_handler("domain-pre-shutdown", self.update_domain_item)
-        self.dispatcher.add_handler("domain-shutdown-failed", self.update_domain_item)
-
-        self.dispatcher.add_handler("domain-add", self.add_domain_item)
-        self.dispatcher.add_handler("domain-delete", self.remove_domain_item)
-
-        self.dispatcher.add_handler("domain-pre-start", self.emit_notification)
-        self.dispatcher.add_handler("domain-start", self.emit_notification)
-        self.dispatcher.add_handler("domain-start-failed", self.emit_notification)
-        self.dispatcher.add_handler("domain-pre-shutdown", self.emit_notification)
-        self.dispatcher.add_handler("domain-shutdown", self.emit_notification)
-        self.dispatcher.add_handler("domain-shutdown-failed", self.emit_notification)
-        self.dispatcher.add_handler(
-            "domain-preload-dispvm-used", self.emit_notification
-        )
+        self._event_handlers = {
+            event: tuple(getattr(self, name) for name in names)
+            for event, names in self.EVENT_TABLE.items()
+        }
+        for event in self._event_handlers:
+            self._connect(self.dispatcher, event, self._fanout)
 
-        self.dispatcher.add_handler("domain-start", self.check_pause_notify)
-        self.dispatcher.add_handler("domain-paused", self.check_pause_notify)
-        self.dispatcher.add_handler("domain-unpaused", self.check_pause_notify)
-        self.dispatcher.add_handler("domain-shutdown", self.check_pause_notify)
+        self._connect(self.stats_dispatcher, "vm-stats", self.update_stats)
 
-        self.dispatcher.add_handler(
-            "domain-feature-set:updates-available", self.feature_change
-        )
-        self.dispatcher.add_handler(
-            "domain-feature-delete:updates-available", self.feature_change
-        )
-        self.dispatcher.add_handler("property-set:netvm", self.property_change)
-        self.dispatcher.add_handler("property-set:label", self.property_change)
-
-        self.dispatcher.add_handler("property-set:debug", self.debug_change)
-        self.dispatcher.add_handler("property-set:guivm", self.debug_change)
-        self.dispatcher.add_handler("domain-feature-set:gui", self.debug_change)
-        self.dispatcher.add_handler("domain-feature-delete:gui", self.debug_change)
-        self.dispatcher.add_handler("domain-feature-set:expert-mode", self.debug_change)
-        self.dispatcher.add_handler(
-            "domain-feature-delete:expert-mode", self.debug_change
-        )
+    def _connect(self, dispatcher, event, handler):
+        """Add a dispatcher handler, remembering it for _disconnect_signals"""
+        self._handler_registrations.append((dispatcher, event, handler))
+        dispatcher.add_handler(event, handler)
 
-        self.dispatcher.add_handler(
-            "domain-feature-set:internal", self.update_domain_item
-        )
-        self.dispatcher.add_handler(
-            "domain-feature-delete:internal", self.update_domain_item
-        )
-
-        self.stats_dispatcher.add_handler("vm-stats", self.update_stats)
+    def _fanout(self, subject, event, **kwargs):
+        """The single dispatcher handler; calls all methods listed for the
+        event in EVENT_TABLE. A failing handler does not prevent the
+        others from running, same as with separately registered ones."""
+        for handler in self._event_handlers[event]:
+            try:
+                handler(subject, event, **kwargs)
+            except Exception:  # pylint: disable=broad-except
+                self.qapp.log.exception("Failed to handle event %s", event)
+
+    def get_vm_flags(self, vm):
+        """Per-qube values needed to build a StartedMenu, cached until
+        debug_change() sees one of them change."""
+        name = str(vm)
+        if name not in self._vm_flags_cache:
+            self._vm_flags_cache[name] = {
+                "debug_console": bool(
+                    getattr(vm, "debug")
+                    or not getattr(vm, "guivm")
+                    or not vm.features.check_with_template("gui", False)
+                    or vm.features.get("expert-mode", False)
+                ),
+                "restartable": vm.klass != "DispVM" or not vm.auto_cleanup,
+            }
+        return self._vm_flags_cache[name]
 
     def debug_change(self, vm, *_args, **_kwargs):
+        # a feature change on a template affects its qubes as well
+        self._vm_flags_cache.clear()
         if vm == self.qapp.local_name:
             self.expert_mode = self.qapp.domains[self.qapp.local_name].features.get(
                 "expert-mode", False
             )
-            vms = self.menu_items
+            items = self.menu_items.values()
         else:
-            vms = {vm}
-        for menu in vms:
-            submenu = self.menu_items[menu].get_submenu()
+            item = self.menu_items.get(vm)
+            items = () if item is None else (item,)
+        for item in items:
+            submenu = item.get_submenu()
             if isinstance(submenu, StartedMenu):
                 submenu.debug_console_update()
 
+    def log_exists(self, path):
+        """Check if a console log exists, using a short-lived listing of
+        the log directory instead of a stat() per file."""
+        now = time.monotonic()
+        if now - self._log_dir_cache["ts"] > LOG_DIR_CACHE_SEC:
+            try:
+                with os.scandir(XEN_CONSOLE_LOG_DIR) as entries:
+                    names = frozenset(
+                        entry.name for entry in entries if entry.is_file()
+                    )
+            except OSError:
+                names = frozenset()
+            self._log_dir_cache = {"ts": now, "names": names}
+        return os.path.basename(path) in self._log_dir_cache["names"]
+
+    def get_action_item(self, vm, item_class, **kwargs):
+        """Return the action menu item of given class for the qube, creating
+        it on first use. Submenus are rebuilt on state changes, but their
+        items are not; an item is moved from its previous submenu and
+        updated to the current shift state."""
+        pool = self._action_pool.setdefault(str(vm), {})
+        item = pool.get(item_class)
+        if item is None:
+            item = item_class(vm, self.icon_cache, **kwargs)
+            pool[item_class] = item
+        else:
+            parent = item.get_parent()
+            if parent is not None:
+                parent.remove(item)
+        if isinstance(item, RunTerminalItem):
+            item.set_as_root(self.shift_pressed)
+        if isinstance(item, (RestartItem, ShutdownItem)):
+            item.set_force(self.shift_pressed)
+        return item
+
+    def get_shutdown_event(self, vm):
+        """asyncio.Event that is set whenever the given qube shuts down"""
+        return self._shutdown_events.setdefault(str(vm), asyncio.Event())
+
     def show_menu(self, _unused, event):
         self.shift_pressed = False
+        # stats are not applied while the menu is closed, see update_stats()
+        self._apply_pending_stats()
         self.tray_menu.popup_at_pointer(event)  # None means current event
 
     def emit_notification(self, vm, event, **kwargs):
+        """Queue a notification about the event; notifications are sent from
+        an idle callback, with repeats of the same (qube, event) dropped."""
+        if event not in NOTIFICATION_SPECS:
+            return
         if event == "domain-preload-dispvm-used":
-            vm_name = kwargs["dispvm"]
-        else:
-            vm_name = vm.name
-        notification = Gio.Notification.new(_("Qube Status: {}").format(vm_name))
-        notification.set_priority(Gio.NotificationPriority.NORMAL)
-
-        if event == "domain-start-failed":
-            notification.set_body(
-                _("Qube {} has failed to start: {}").format(vm.name, kwargs["reason"])
-            )
-            notification.set_priority(Gio.NotificationPriority.HIGH)
-            notification.set_icon(Gio.ThemedIcon.new("dialog-warning"))
-        elif event == "domain-pre-start":
-            notification.set_body(_("Qube {} is starting.").format(vm.name))
-        elif event == "domain-start":
-            notification.set_body(_("Qube {} has started.").format(vm.name))
-        elif event == "domain-preload-dispvm-used":
-            notification.set_body(
-                _("Qube {} was preloaded and is now being used.").format(
-                    kwargs["dispvm"]
-                )
-            )
-        elif event == "domain-pre-shutdown":
-            notification.set_body(
-                _("Qube {} is attempting to shut down.").format(vm.name)
-            )
-        elif event == "domain-shutdown":
-            notification.set_body(_("Qube {} has shut down.").format(vm.name))
-        elif event == "domain-shutdown-failed":
-            notification.set_body(
-                _("Qube {} failed to shut down: {}").format(vm.name, kwargs["reason"])
-            )
-            notification.set_priority(Gio.NotificationPriority.HIGH)
-            notification.set_icon(Gio.ThemedIcon.new("dialog-warning"))
+            key = (kwargs["dispvm"], event)
         else:
+            key = (vm.name, event)
+        if key in self._pending_notifications:
             return
+        self._pending_notifications[key] = kwargs
+        if len(self._pending_notifications) == 1:
+            GLib.idle_add(self._flush_notifications)
+
+    def _flush_notifications(self):
+        pending, self._pending_notifications = self._pending_notifications, {}
+        for (vm_name, event), kwargs in pending.items():
+            self._send_domain_notification(vm_name, event, kwargs)
+        return False
+
+    def _send_domain_notification(self, name, event, kwargs):
+        """:param name: name of the qube the notification is about"""
+        body, priority, warning = NOTIFICATION_SPECS[event]
+        notification = Gio.Notification.new(_("Qube Status: {}").format(name))
+        notification.set_body(body.format(name, kwargs.get("reason")))
+        notification.set_priority(priority)
+        if warning:
+            notification.set_icon(self._warning_icon)
         self.send_notification(None, notification)
 
     def emit_paused_notification(self):
@@ -948,7 +1319,7 @@ class DomainTray(Gtk.Application):
                     "Qubes Domains tray widget."
                 )
             )
-            notification.set_icon(Gio.ThemedIcon.new("dialog-warning"))
+            notification.set_icon(self._warning_icon)
             notification.add_button(_("Unpause All"), "app.do-unpause-all")
             notification.set_priority(Gio.NotificationPriority.HIGH)
             self.send_notification("vms-paused", notification)
@@ -978,11 +1349,12 @@ class DomainTray(Gtk.Application):
             self.withdraw_paused_notification()
 
     def have_running_and_all_are_paused(self):
+        # uses states tracked by the menu items, not qubesd queries
         found_paused = False
-        for vm in self.qapp.domains:
-            if vm.klass == "AdminVM" or getattr(vm, "is_preload", False):
+        for item in self.menu_items.values():
+            if item.skip_pause_check:
                 continue
-            if vm.is_running() and vm.is_paused():
+            if item.power_state == "Paused":
                 # a running that is paused
                 found_paused = True
             else:
@@ -990,11 +1362,16 @@ class DomainTray(Gtk.Application):
                 return False
         return found_paused
 
+    def preload_used(self, _vm, _event, **kwargs):
+        item = self.menu_items.get(kwargs["dispvm"])
+        if item is not None:
+            # no longer a preloaded disposable; it counts for pause checks
+            item.skip_pause_check = False
+
     def add_domain_item(self, _submitter, event, vm, **_kwargs):
         """Add a DomainMenuItem to menu; if event is None, this was fired
-        manually (mot due to domain-add event, and it is assumed the menu items
-        are created in alphabetical order. Otherwise, this method will
-        attempt to sort menu items correctly."""
+        manually (not due to domain-add event). The item is placed after the
+        header and AdminVM(s), in alphabetical order."""
         # check if it already exists
         try:
             vm = self.qapp.domains[str(vm)]
@@ -1005,7 +1382,7 @@ class DomainTray(Gtk.Application):
         if vm in self.menu_items:
             return
 
-        state = STATE_DICTIONARY.get(event)
+        state = self._state_lookup(event)
         if not state:
             try:
                 state = vm.get_power_state()
@@ -1017,88 +1394,140 @@ class DomainTray(Gtk.Application):
                 state = "Halted"
 
         domain_item = DomainMenuItem(vm, self, self.icon_cache, state=state)
-        if not event:  # menu item creation at widget start; we can assume
-            # menu items are created in alphabetical order
-            self.tray_menu.add(domain_item)
+        domain_item.skip_pause_check = vm.klass == "AdminVM" or getattr(
+            vm, "is_preload", False
+        )
+        # menu layout: header, AdminVM(s), the rest sorted by name
+        if vm.klass == "AdminVM":
+            self._adminvm_count += 1
+            position = self._adminvm_count
         else:
-            position = 0
-            for i in self.tray_menu:  # pylint: disable=not-an-iterable
-                if not hasattr(i, "vm"):  # we reached the end
-                    break
-                if not i.vm:  # header should be skipper
-                    position += 1
-                    continue
-                if i.vm.klass == "AdminVM":
-                    # AdminVM(s) should be skipped
-                    position += 1
-                    continue
-                if i.vm.name > vm.name:
-                    # we reached correct alphabetical placement for the VM
-                    break
-                position += 1
-            self.tray_menu.insert(domain_item, position)
+            index = bisect.bisect_left(self._sorted_names, vm.name)
+            self._sorted_names.insert(index, vm.name)
+            position = 1 + self._adminvm_count + index
+        self.tray_menu.insert(domain_item, position)
         self.menu_items[vm] = domain_item
+        if state != "Halted":
+            self._ensure_template_indexed(vm)
 
     def property_change(self, vm, event, *_args, **_kwargs):
-        if vm not in self.menu_items:
+        item = self.menu_items.get(vm)
+        if item is None:
+            return
+        if event == "property-set:template":
+            if str(vm) in self._template_of:
+                # not indexed yet ones are indexed when they are started
+                self._index_template(vm)
+        elif not item.built:
+            # the widgets read current values once they are built
             return
-        if event == "property-set:netvm":
-            self.menu_items[vm].name.update_tooltip(netvm_changed=True)
+        elif event == "property-set:netvm":
+            item.name.update_tooltip(netvm_changed=True)
         elif event == "property-set:label":
-            self.menu_items[vm].set_label_icon()
+            item.set_label_icon()
 
     def feature_change(self, vm, *_args, **_kwargs):
-        if vm not in self.menu_items:
+        item = self.menu_items.get(vm)
+        if item is None or not item.built:
             return
-        self.menu_items[vm].name.update_updateable()
+        item.name.update_updateable()
 
-    def refresh_tooltips(self):
-        for item in self.menu_items.values():
-            if item.vm and item.is_visible():
-                try:
-                    item.name.update_tooltip(storage_changed=True)
-                except Exception:  # pylint: disable=broad-except
-                    pass
+    def internal_change(self, vm, event, **kwargs):
+        item = self.menu_items.get(vm)
+        if item is None:
+            return
+        internal = event.startswith("domain-feature-set:") and bool(kwargs.get("value"))
+        item.set_internal(internal)
 
     def remove_domain_item(self, _submitter, _event, vm, **_kwargs):
-        if vm not in self.menu_items:
+        vm_widget = self.menu_items.pop(vm, None)
+        if vm_widget is None:
             return
-        vm_widget = self.menu_items[vm]
         self.tray_menu.remove(vm_widget)
-        del self.menu_items[vm]
+        name = str(vm)
+        self._unindex_template(name)
+        index = bisect.bisect_left(self._sorted_names, name)
+        if index < len(self._sorted_names) and self._sorted_names[index] == name:
+            del self._sorted_names[index]
+        else:
+            self._adminvm_count -= 1
+        self._vm_flags_cache.pop(str(vm), None)
+        self._pending_stats.pop(name, None)
+        self._shutdown_events.pop(name, None)
+        for item in self._action_pool.pop(str(vm), {}).values():
+            item.destroy()
+
+    def _ensure_template_indexed(self, vm):
+        """Index the template of a qube that is not halted, and the
+        template of that template, which a DispVM's template can be based
+        on. Halted qubes are not looked at by handle_domain_shutdown(), so
+        they are only indexed once they start."""
+        if str(vm) in self._template_of:
+            return
+        template = self._index_template(vm)
+        if template is not None and str(template) not in self._template_of:
+            self._index_template(template)
+
+    def _index_template(self, vm):
+        """Record the template of the qube (None if it has none) in the
+        reverse index used by handle_domain_shutdown(). Returns the
+        template."""
+        name = str(vm)
+        self._unindex_template(name)
+        try:
+            template = getattr(vm, "template", None)
+        except exc.QubesException:
+            template = None
+        self._template_of[name] = None if template is None else str(template)
+        if template is not None:
+            self._children_of.setdefault(str(template), set()).add(name)
+        return template
+
+    def _unindex_template(self, name):
+        template = self._template_of.pop(name, None)
+        if template is not None:
+            children = self._children_of[template]
+            children.discard(name)
+            if not children:
+                del self._children_of[template]
 
     def handle_domain_shutdown(self, vm):
-        try:
-            if getattr(vm, "klass", None) == "TemplateVM" or getattr(
-                vm, "template_for_dispvms", False
-            ):
-                for menu_item in self.menu_items.values():
-                    try:
-                        if not menu_item.vm.is_running():
-                            # A VM based on this template can only be
-                            # outdated if the VM is currently running.
-                            continue
-                    except exc.QubesPropertyAccessError:
-                        continue
-                    template1 = getattr(menu_item.vm, "template", None)
-                    template2 = getattr(template1, "template", None)
-                    if vm in (template1, template2) and any(
-                        vol.is_outdated() for vol in menu_item.vm.volumes.values()
-                    ):
-                        menu_item.name.update_outdated(True)
-        except exc.QubesVMNotFoundError:
-            # attribute not available anymore as VM was removed
-            # in the meantime
-            pass
+        # qubes based on vm: directly, or through a disposable template
+        children = self._children_of.get(str(vm), set())
+        candidates = set(children)
+        for child in children:
+            candidates.update(self._children_of.get(child, ()))
+
+        for child in candidates:
+            menu_item = self.menu_items.get(child)
+            if menu_item is None or not menu_item.built:
+                continue
+            try:
+                if not menu_item.vm.is_running():
+                    # A VM based on this template can only be
+                    # outdated if the VM is currently running.
+                    continue
+                if any(vol.is_outdated() for vol in menu_item.vm.volumes.values()):
+                    menu_item.name.update_outdated(True)
+                    menu_item.storage_dirty = True
+            except exc.QubesPropertyAccessError:
+                continue
+            except exc.QubesVMNotFoundError:
+                # attribute not available anymore as VM was removed
+                # in the meantime
+                continue
 
     def update_domain_item(self, vm, event, **kwargs):
         """Update the menu item with the started menu for
         the specified vm in the tray"""
+        if event == "domain-shutdown" and str(vm) in self._shutdown_events:
+            self._shutdown_events[str(vm)].set()
+
         try:
             item = self.menu_items[vm]
         except exc.QubesPropertyAccessError:
-            print(_("Unexpected property access error"))  # req by @marmarek
-            traceback.print_exc()
+            # the traceback is only formatted if debug logging is enabled
+            self.qapp.log.debug("Unexpected property access error", exc_info=True)
             self.remove_domain_item(vm, event, **kwargs)
             return
         except KeyError:
@@ -1108,48 +1537,105 @@ class DomainTray(Gtk.Application):
                 return
             item = self.menu_items[vm]
 
-        if event in STATE_DICTIONARY:
-            state = STATE_DICTIONARY[event]
-        else:
+        state = self._state_lookup(event)
+        if state is None:
             try:
                 state = vm.get_power_state()
             except Exception:  # pylint: disable=broad-except
                 # it's a fragile DispVM
                 state = "Transient"
 
-        item.update_state(state)
-
         if event == "domain-shutdown":
             self.handle_domain_shutdown(vm)
             # if the VM was shut down, it is no longer outdated
-            item.name.update_outdated(False)
+            if item.built:
+                item.name.update_outdated(False)
 
-        if event in ("domain-start", "domain-pre-start"):
+        if event in ("domain-start", "domain-pre-start") and item.built:
             # A newly started VM should not be outdated.
             item.name.update_outdated(False)
-            item.show_all()
-        if event == "domain-shutdown":
-            item.hide()
+            item.storage_dirty = True
+
+        self._queue_state(vm, item, event, state)
+
+    def _queue_state(self, vm, item, event, state):
+        # tracked right away, check_pause_notify() runs before the update
+        item.power_state = state
+        if state != "Halted":
+            self._ensure_template_indexed(vm)
+
+        # events for a single qube tend to come in bursts (pre-start, start,
+        # ...); update the menu item only once, for the last one
+        self._pending_state[str(vm)] = (event, state)
+        self._schedule_flush()
 
     def update_stats(self, vm, _event, **kwargs):
         if vm not in self.menu_items:
             return
-        self.menu_items[vm].update_stats(kwargs["memory_kb"], kwargs["cpu_usage"])
+        # only the latest stats of a qube matter; while the menu is closed
+        # nobody can see them, they are kept until it is shown
+        self._pending_stats[str(vm)] = (kwargs["memory_kb"], kwargs["cpu_usage"])
+        if self.tray_menu.get_visible():
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            GLib.idle_add(self._flush_pending, priority=GLib.PRIORITY_LOW)
+
+    def _flush_pending(self):
+        """Apply all queued state and stats updates to the menu items."""
+        self._flush_scheduled = False
+        pending_state, self._pending_state = self._pending_state, {}
+
+        for name, (event, state) in pending_state.items():
+            item = self.menu_items.get(name)
+            if item is None:
+                # removed in the meantime
+                continue
+            if not item.update_state(state):
+                # already showing this state, visibility included
+                continue
+            if event in ("domain-start", "domain-pre-start"):
+                item.show_all()
+            if event == "domain-shutdown":
+                item.hide()
+
+        self._apply_pending_stats()
+        return False
+
+    def _apply_pending_stats(self):
+        pending_stats, self._pending_stats = self._pending_stats, {}
+        for name, (memory_kb, cpu_usage) in pending_stats.items():
+            item = self.menu_items.get(name)
+            if item is not None:
+                item.update_stats(memory_kb, cpu_usage)
 
     def initialize_menu(self):
         self.tray_menu.add(DomainMenuItem(None, self, self.icon_cache))
 
-        # Add AdminVMS
-        for vm in sorted([vm for vm in self.qapp.domains if vm.klass == "AdminVM"]):
-            self.add_domain_item(None, None, vm)
+        admin_vms, other_vms = [], []
+        for vm in self.qapp.domains:
+            (admin_vms if vm.klass == "AdminVM" else other_vms).append(vm)
+
+        # items are only shown below, once all of them are in the menu;
+        # hold back child property notifications until then as well
+        self.tray_menu.freeze_child_notify()
+        try:
+            # Add AdminVMS
+            by_name = attrgetter("name")
+            for vm in sorted(admin_vms, key=by_name):
+                self.add_domain_item(None, None, vm)
 
-        # and the rest of them
-        for vm in sorted([vm for vm in self.qapp.domains if vm.klass != "AdminVM"]):
-            self.add_domain_item(None, None, vm)
+            # and the rest of them
+            for vm in sorted(other_vms, key=by_name):
+                self.add_domain_item(None, None, vm)
+        finally:
+            self.tray_menu.thaw_child_notify()
 
         for item in self.menu_items.values():
             try:
-                if item.vm and item.vm.is_running():
+                if item.built and item.vm and item.vm.is_running():
                     item.name.update_tooltip(storage_changed=True)
                     item.show_all()
                 else:
@@ -1168,77 +1654,36 @@ class DomainTray(Gtk.Application):
         self.connect("shutdown", self._disconnect_signals)
 
     def refresh_all(self, _subject, _event, **_kwargs):
-        items_to_delete = []
-        for vm in self.menu_items:
-            if vm not in self.qapp.domains:
-                items_to_delete.append(vm)
-        for vm in items_to_delete:
+        # the events connection was re-established, so the cached list can
+        # be stale; one admin.vm.List call refreshes it, together with the
+        # cached power states, then list the domains once instead of a
+        # membership query per item
+        self.qapp.domains.refresh_cache(force=True)
+        domains = list(self.qapp.domains)
+        current = {str(vm) for vm in domains}
+        for vm in [vm for vm in self.menu_items if str(vm) not in current]:
             self.remove_domain_item(None, None, vm)
-        for vm in self.qapp.domains:
-            self.update_domain_item(vm, "")
+
+        for vm in domains:
+            item = self.menu_items.get(vm)
+            if item is None:
+                self.update_domain_item(vm, "")
+                continue
+            try:
+                state = vm.get_power_state()
+            except Exception:  # pylint: disable=broad-except
+                # it's a fragile DispVM
+                state = "Transient"
+            if state != item.power_state:
+                self._queue_state(vm, item, "", state)
 
     def run(self):  # pylint: disable=arguments-differ
         self.initialize_menu()
 
     def _disconnect_signals(self, _event):
-        self.dispatcher.remove_handler("connection-established", self.refresh_all)
-        self.dispatcher.remove_handler("domain-pre-start", self.update_domain_item)
-        self.dispatcher.remove_handler("domain-start", self.update_domain_item)
-        self.dispatcher.remove_handler("domain-start-failed", self.update_domain_item)
-        self.dispatcher.remove_handler("domain-paused", self.update_domain_item)
-        self.dispatcher.remove_handler("domain-unpaused", self.update_domain_item)
-        self.dispatcher.remove_handler("domain-shutdown", self.update_domain_item)
-        self.dispatcher.remove_handler("domain-pre-shutdown", self.update_domain_item)
-        self.dispatcher.remove_handler(
-            "domain-shutdown-failed", self.update_domain_item
-        )
-
-        self.dispatcher.remove_handler("domain-add", self.add_domain_item)
-        self.dispatcher.remove_handler("domain-delete", self.remove_domain_item)
-
-        self.dispatcher.remove_handler("domain-pre-start", self.emit_notification)
-        self.dispatcher.remove_handler("domain-start", self.emit_notification)
-        self.dispatcher.remove_handler("domain-start-failed", self.emit_notification)
-        self.dispatcher.remove_handler("domain-pre-shutdown", self.emit_notification)
-        self.dispatcher.remove_handler("domain-shutdown", self.emit_notification)
-        self.dispatcher.remove_handler("domain-shutdown-failed", self.emit_notification)
-        self.dispatcher.remove_handler(
-            "domain-preload-dispvm-used", self.emit_notification
-        )
-
-        self.dispatcher.remove_handler("domain-start", self.check_pause_notify)
-        self.dispatcher.remove_handler("domain-paused", self.check_pause_notify)
-        self.dispatcher.remove_handler("domain-unpaused", self.check_pause_notify)
-        self.dispatcher.remove_handler("domain-shutdown", self.check_pause_notify)
-
-        self.dispatcher.remove_handler(
-            "domain-feature-set:updates-available", self.feature_change
-        )
-        self.dispatcher.remove_handler(
-            "domain-feature-delete:updates-available", self.feature_change
-        )
-        self.dispatcher.remove_handler("property-set:netvm", self.property_change)
-        self.dispatcher.remove_handler("property-set:label", self.property_change)
-
-        self.dispatcher.remove_handler("property-set:debug", self.debug_change)
-        self.dispatcher.remove_handler("property-set:guivm", self.debug_change)
-        self.dispatcher.remove_handler("domain-feature-set:gui", self.debug_change)
-        self.dispatcher.remove_handler("domain-feature-delete:gui", self.debug_change)
-        self.dispatcher.remove_handler(
-            "domain-feature-set:expert-mode", self.debug_change
-        )
-        self.dispatcher.remove_handler(
-            "domain-feature-delete:expert-mode", self.debug_change
-        )
-
-        self.dispatcher.remove_handler(
-            "domain-feature-set:internal", self.update_domain_item
-        )
-        self.dispatcher.remove_handler(
-            "domain-feature-delete:internal", self.update_domain_item
-        )
-
-        self.stats_dispatcher.remove_handler("vm-stats", self.update_stats)
+        for dispatcher, event, handler in self._handler_registrations:
+            dispatcher.remove_handler(event, handler)
+        self._handler_registrations.clear()
 
     @property
     def shift_pressed(self):
@@ -1254,19 +1699,16 @@ class DomainTray(Gtk.Application):
             return
 
         self._shift_pressed = shift_pressed
-        for item in self.menu_items.values():
-            if item.vm:
-                submenu = item.get_submenu()
-                if submenu is None:
-                    continue
-
-                def do_emit(child):
-                    if isinstance(child, RunTerminalItem):
-                        child.set_as_root(shift_pressed)
-                    if isinstance(child, (RestartItem, ShutdownItem)):
-                        child.set_force(shift_pressed)
-
-                submenu.foreach(do_emit)
+        # every shift-dependent item lives in the action pool, whichever
+        # submenu it is currently in
+        for pool in self._action_pool.values():
+            terminal_item = pool.get(RunTerminalItem)
+            if terminal_item is not None:
+                terminal_item.set_as_root(shift_pressed)
+            for item_class in (RestartItem, ShutdownItem):
+                item = pool.get(item_class)
+                if item is not None:
+                    item.set_force(shift_pressed)
 
     def key_event(self, _unused, event):
         if event.keyval in [Gdk.KEY_Shift_L, Gdk.KEY_Shift_R]:
@@ -1287,6 +1729,10 @@ def main():
     app.run()
 
     loop = asyncio.get_event_loop()
+    if hasattr(asyncio, "eager_task_factory"):  # python 3.12+
+        # most menu actions finish before their first await; run them
+        # right away instead of scheduling them for the next iteration
+        loop.set_task_factory(asyncio.eager_task_factory)
     tasks = [
         asyncio.ensure_future(dispatcher.listen_for_events()),
         asyncio.ensure_future(stats_dispatcher.listen_for_events()),